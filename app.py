@@ -1,21 +1,229 @@
 # app.py - MINIMAL VERSION
+import time
+IMPORT_STARTED = time.perf_counter()
+
 from flask import Flask
-from flask_mysqldb import MySQL
+from db import Database
+from cache import StudentCache
+from auth import PasswordHasher, TokenManager
+from metrics import Metrics
+from profiling import RequestProfiler
+from stats import StatsReconciler
+from events import EventBroker
+from compression import Compressor
+from jobs import JobQueue
+
+# STUDENT_API_<NAME>=<value> overrides Config.<NAME>; values are read as
+# JSON when they parse (numbers, booleans, lists), else as strings
+ENV_PREFIX = 'STUDENT_API'
+
+# ==================== CONFIGURATION ====================
+class Config:
+    """Defaults for create_app."""
+    # Signs sessions and JWTs; set STUDENT_API_SECRET_KEY in production
+    SECRET_KEY = 'your-secret-key-for-jwt'
+
+    # MySQL Configuration
+    MYSQL_HOST = 'localhost'
+    MYSQL_USER = 'root'
+    MYSQL_PASSWORD = 'root'
+    MYSQL_DB = 'cs_elec'
+
+    # Connection pool (see db.py); DATABASE_STANDIN points the pool at a local
+    # SQLite file instead of MySQL for tests and benchmarks
+    MYSQL_POOL_MIN_SIZE = 2
+    MYSQL_POOL_MAX_SIZE = 10
+    MYSQL_POOL_RECYCLE = 3600
+    MYSQL_POOL_PRE_PING = True
+    MYSQL_POOL_TIMEOUT = 5.0
+    DATABASE_STANDIN = None
+
+    # Read replicas: reads go to these by weighted round-robin, writes to the
+    # primary above. Entries look like {'host': 'replica1', 'weight': 2}; a
+    # replica that fails a checkout sits out MYSQL_REPLICA_EJECT_SECONDS. A
+    # client that just wrote reads from the primary for MYSQL_PRIMARY_PIN_SECONDS.
+    MYSQL_REPLICAS = []
+    DATABASE_STANDIN_REPLICAS = []
+    MYSQL_REPLICA_EJECT_SECONDS = 30
+    MYSQL_PRIMARY_PIN_SECONDS = 5
+
+    # Pagination / streaming
+    PAGE_SIZE_DEFAULT = 100
+    PAGE_SIZE_MAX = 1000
+    STREAM_BATCH_SIZE = 500
+
+    # /students HTML page: rows per page (?limit=) and the largest allowed
+    STUDENTS_PAGE_SIZE = 25
+    STUDENTS_PAGE_SIZE_MAX = 100
+
+    # Search
+    SEARCH_LIMIT_DEFAULT = 50
+    SEARCH_LIMIT_MAX = 500
+
+    # Password hashing: bcrypt work factor, dedicated hashing threads, global
+    # cap on queued+running hashes, and per-client login attempts
+    BCRYPT_ROUNDS = 12
+    BCRYPT_WORKERS = 2
+    BCRYPT_MAX_PENDING = 8
+    AUTH_RATE_PER_SECOND = 2.0
+    AUTH_BURST = 20
+
+    # Verified-token cache size; revocation list for logout
+    TOKEN_CACHE_SIZE = 10000
+    TOKEN_REVOCATION = True
+
+    # Bulk writes
+    BULK_CHUNK_SIZE = 1000
+    BULK_CHUNK_SIZE_MAX = 10000
+
+    # Multi-get (?ids=) and /api/batch: ids per request, ids per IN (...)
+    # statement, sub-operations per batch
+    BATCH_IDS_MAX = 1000
+    IN_CHUNK_SIZE = 500
+    BATCH_MAX_OPERATIONS = 100
+
+    # Read-through cache for student reads (in-process LRU+TTL by default).
+    # CACHE_BACKEND set to a shared cache.CacheBackend, or to a file path for
+    # cache.SQLiteCache, also carries token revocations, login throttling and
+    # events across workers; serve.py needs one for more than one worker.
+    CACHE_BACKEND = None
+    CACHE_MAX_ENTRIES = 10000
+    CACHE_TTL = 300
+
+    # Request metrics at /metrics; slower requests are logged with their queries
+    METRICS_ENABLED = True
+    SLOW_REQUEST_SECONDS = 1.0
+    SLOW_REQUEST_MAX_QUERIES = 20
+
+    # Sampling profiler: profile this fraction of requests, plus any request
+    # sending PROFILE_HEADER: PROFILE_SECRET. Both off means no hooks at all.
+    PROFILE_SAMPLE_RATE = 0.0
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_SECRET = None
+    # Usernames allowed to list and download profiles (none by default)
+    PROFILE_ADMINS = ()
+
+    # Rebuild /api/students/stats counters from the table this often (seconds;
+    # 0 turns the background job off)
+    STATS_RECONCILE_INTERVAL = 3600
+
+    # Delta sync (/api/students/changes) stops at a missing sequence number
+    # this recent, which may be a write still to commit; longer than the
+    # longest write transaction (bulk and import batches, delete jobs)
+    CHANGES_SETTLE_SECONDS = 60
+
+    # Change events at /api/students/events (SSE): per-subscriber queue, replay
+    # buffer for Last-Event-ID, keep-alive interval in seconds
+    EVENTS_QUEUE_SIZE = 100
+    EVENTS_BUFFER_SIZE = 1000
+    EVENTS_PING_INTERVAL = 15
+    EVENTS_MAX_SUBSCRIBERS = 1000
+
+    # Response compression: gzip/deflate (and br with the brotli module),
+    # bodies under COMPRESS_MIN_SIZE bytes go out as they are; compressed
+    # bodies of ETagged responses are kept for COMPRESS_CACHE_TTL seconds
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVELS = {'br': 4, 'gzip': 6, 'deflate': 6}
+    COMPRESS_CACHE_ENTRIES = 1000
+    COMPRESS_CACHE_TTL = 300
+
+    # Background jobs (/api/jobs): worker threads, jobs allowed to wait, how
+    # often progress is saved (seconds), rows per batch, where results go
+    JOBS_WORKERS = 2
+    JOBS_MAX_PENDING = 100
+    JOBS_PROGRESS_INTERVAL = 1.0
+    JOBS_BATCH_SIZE = 1000
+
+    # Production server (serve.py): worker processes (None: one per CPU with
+    # a shared CACHE_BACKEND, else 1), request threads per worker, further
+    # threads per worker for streams (SSE), requests before a worker is
+    # replaced (0 = never; jitter staggers the replacements), seconds to
+    # finish in-flight work on shutdown, and idle keep-alive seconds
+    SERVE_HOST = '0.0.0.0'
+    SERVE_PORT = 5000
+    SERVE_WORKERS = None
+    SERVE_THREADS = 8
+    SERVE_STREAMS = 100
+    SERVE_MAX_REQUESTS = 10000
+    SERVE_MAX_REQUESTS_JITTER = 1000
+    SERVE_GRACEFUL_TIMEOUT = 30
+    SERVE_KEEPALIVE = 5
+
+# ==================== EXTENSIONS ====================
+# Module-level so routes can import them; create_app binds them to the
+# application, so a process serves one application at a time
+db = Database()
+cache = StudentCache()
+hasher = PasswordHasher()
+tokens = TokenManager()
+metrics = Metrics(db=db)
+profiler = RequestProfiler()
+reconciler = StatsReconciler(db=db)
+events = EventBroker()
+compressor = Compressor()
+jobs = JobQueue(db=db)
+
+# ==================== FACTORY ====================
+def create_app(config=None):
+    """
+    Build the application: Config, then STUDENT_API_* environment
+    variables, then the config mapping, e.g. create_app({'DATABASE_STANDIN':
+    path}). Nothing connects to the database or starts a thread here, so
+    serve.py can build the app once and fork workers from it.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.from_prefixed_env(ENV_PREFIX)
+    if config:
+        app.config.update(config)
+
+    cache.init_app(app)
+    # State every worker must agree on goes through a shared backend
+    shared = cache.backend if cache.backend.shared else None
+    db.init_app(app, shared)
+    hasher.init_app(app, shared)
+    tokens.init_app(app, shared)
+    metrics.init_app(app, db)
+    hasher.observe = metrics.observe
+    profiler.init_app(app)
+    reconciler.init_app(app, db)
+    events.init_app(app, shared)
+    compressor.init_app(app)
+    jobs.init_app(app, db)
+
+    # The views, and modules only they use such as serializers, load
+    # here rather than when this module is imported
+    from routes import bp
+    app.register_blueprint(bp)
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-for-sessions'
+    # Cold start: importing this module (Flask and the extensions), then
+    # building the app; reported at /metrics and by serve.py
+    metrics.startup = {
+        'import': round(IMPORT_FINISHED - IMPORT_STARTED, 6),
+        'create_app': round(time.perf_counter() - started, 6)
+    }
+    return app
 
-# MySQL Configuration
-app.config['MYSQL_HOST'] = 'localhost'
-app.config['MYSQL_USER'] = 'root'
-app.config['MYSQL_PASSWORD'] = 'root'
-app.config['MYSQL_DB'] = 'cs_elec'
-app.config['SECRET_KEY'] = 'your-secret-key-for-jwt'
+def shutdown(timeout):
+    """Let background jobs finish (up to timeout seconds), then close the pools."""
+    drained = jobs.drain(timeout)
+    db.reset()
+    return drained
 
-mysql = MySQL(app)
+def __getattr__(name):
+    # `from app import app` (tests, scripts): a default application,
+    # built on first use
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Import ALL routes from routes.py
-from routes import *
+IMPORT_FINISHED = time.perf_counter()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Through the module, not __main__, so routes share its extensions.
+    # Development server only; use serve.py in production.
+    from app import create_app
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,248 @@
+# auth.py
+import hashlib
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import jwt
+
+from cache import LRUCache
+
+class Overloaded(Exception):
+    """Raised when auth work is shed; retry_after is in seconds."""
+    def __init__(self, retry_after):
+        super().__init__(f'Too many requests, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+class TokenRevoked(jwt.InvalidTokenError):
+    pass
+
+# ==================== RATE LIMITING ====================
+class TokenBucket:
+    """
+    Per-client token buckets: each client may burst up to `burst`
+    attempts and then refills at `rate` attempts per second. Buckets live
+    in this process, or in a shared CacheBackend so that every worker
+    draws from the same one.
+    """
+    def __init__(self, rate=1.0, burst=5, max_clients=10000, backend=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.backend = backend
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        """Take one token for key or raise Overloaded."""
+        if self.backend is None:
+            now = time.monotonic()
+            with self._lock:
+                self._buckets[key], retry_after = self._take(self._buckets.get(key), now)
+                if len(self._buckets) > self.max_clients:
+                    self._prune(now)
+        else:
+            outcome = []
+
+            def take(bucket):
+                bucket, retry_after = self._take(bucket, time.time())
+                outcome.append(retry_after)
+                return bucket
+            # A bucket left alone this long is full again
+            self.backend.update(f'ratelimit:{key}', take, ttl=math.ceil(self.burst / self.rate) + 1)
+            retry_after = outcome[-1]
+        if retry_after:
+            raise Overloaded(retry_after)
+
+    def _take(self, bucket, now):
+        """(new bucket, seconds until a token is free, or None when one was taken)"""
+        tokens, last = bucket or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            return (tokens, now), math.ceil((1 - tokens) / self.rate)
+        return (tokens - 1, now), None
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = self.burst / self.rate
+        for key, (_, last) in list(self._buckets.items()):
+            if now - last >= full_after:
+                del self._buckets[key]
+
+# ==================== PASSWORD HASHING ====================
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool instead of the request
+    thread. bcrypt releases the GIL, so other routes keep being served
+    while hashes are computed. At most BCRYPT_MAX_PENDING hashes may be
+    queued or running; beyond that requests are shed with Overloaded
+    before the CPU saturates.
+    """
+    def __init__(self, app=None):
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, shared=None):
+        app.config.setdefault('BCRYPT_ROUNDS', 12)
+        app.config.setdefault('BCRYPT_WORKERS', max(1, (os.cpu_count() or 2) // 2))
+        app.config.setdefault('BCRYPT_MAX_PENDING', 4 * app.config['BCRYPT_WORKERS'])
+        app.config.setdefault('BCRYPT_TIMEOUT', 10)
+        app.config.setdefault('AUTH_RATE_PER_SECOND', 1.0)
+        app.config.setdefault('AUTH_BURST', 5)
+
+        self.rounds = app.config['BCRYPT_ROUNDS']
+        self.timeout = app.config['BCRYPT_TIMEOUT']
+        # Rebinding (create_app again) keeps the pool unless its size changes
+        if self.executor is None or self.workers != app.config['BCRYPT_WORKERS']:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.workers = app.config['BCRYPT_WORKERS']
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='bcrypt')
+        self.slots = threading.BoundedSemaphore(app.config['BCRYPT_MAX_PENDING'])
+        # shared: a CacheBackend every worker sees, so the limit is per client, not per worker
+        self.limiter = TokenBucket(app.config['AUTH_RATE_PER_SECOND'], app.config['AUTH_BURST'], backend=shared)
+        # Rolling estimate of one hash, used to compute Retry-After
+        self.average_seconds = 0.25
+        # Optional observe(section, label, seconds) callback, e.g. Metrics.observe
+        self.observe = None
+
+    def _run(self, func, *args):
+        slots = self.slots
+        if not slots.acquire(blocking=False):
+            raise Overloaded(max(1, math.ceil(self.average_seconds)))
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.average_seconds = 0.9 * self.average_seconds + 0.1 * (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        future = self.executor.submit(timed)
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            # Wall time seen by the request, queueing included
+            if self.observe:
+                self.observe('bcrypt', func.__name__.lstrip('_'), time.perf_counter() - start)
+
+    def throttle(self, client_key):
+        """Apply the per-client token bucket; raises Overloaded."""
+        self.limiter.consume(client_key)
+
+    def hash(self, password):
+        """Hash a password for storing."""
+        return self._run(self._hash, password)
+
+    def verify(self, hashed_password, password):
+        """Verify a stored password against one provided by user"""
+        return self._run(self._verify, hashed_password, password)
+
+    def needs_rehash(self, hashed_password):
+        """True when the stored hash was made with a lower work factor."""
+        try:
+            return int(hashed_password.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    # bcrypt is imported on first use: only login and registration need it
+    def _hash(self, password):
+        import bcrypt
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+    @staticmethod
+    def _verify(hashed_password, password):
+        import bcrypt
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+# ==================== TOKENS ====================
+class TokenManager:
+    """
+    Issues and verifies the JWTs used by both the web and API logins.
+
+    Claims are always user_id, username, jti and exp. Verified tokens are
+    kept in a bounded LRU keyed by the token's SHA-256 digest until they
+    expire, so repeat calls skip the decode and HMAC check. Revoked token
+    ids are checked on every call, cached or not: in a dict, or in the
+    shared CacheBackend when there is one, so a logout in one worker
+    holds in all of them.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, shared=None):
+        app.config.setdefault('TOKEN_CACHE_SIZE', 10000)
+        app.config.setdefault('TOKEN_REVOCATION', True)
+
+        self.secret = app.config['SECRET_KEY']
+        self.verified = LRUCache(max_entries=app.config['TOKEN_CACHE_SIZE'], ttl=0)
+        self.revocation_enabled = app.config['TOKEN_REVOCATION']
+        self.revoked = {}
+        self.shared = shared
+        self._lock = threading.Lock()
+
+    def issue(self, user_id, username, expires_in):
+        """Create a signed token for a user; expires_in is a timedelta."""
+        return jwt.encode({
+            'user_id': user_id,
+            'username': username,
+            'jti': uuid.uuid4().hex,
+            'exp': datetime.now(timezone.utc) + expires_in
+        }, self.secret, algorithm='HS256')
+
+    def verify(self, token):
+        """
+        Return the token's claims. Raises jwt.ExpiredSignatureError,
+        TokenRevoked or jwt.InvalidTokenError.
+        """
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        claims = self.verified.get(key)
+
+        if claims is None:
+            claims = jwt.decode(token, self.secret, algorithms=['HS256'])
+            remaining = claims['exp'] - time.time() if 'exp' in claims else 0
+            if remaining > 0:
+                self.verified.set(key, claims, ttl=remaining)
+        elif claims['exp'] <= time.time():
+            # The LRU expiry is a bound, exp is the authority
+            self.verified.delete(key)
+            raise jwt.ExpiredSignatureError('Signature has expired')
+
+        if self.revocation_enabled and self.is_revoked(claims.get('jti')):
+            raise TokenRevoked('Token has been revoked')
+        return claims
+
+    def is_revoked(self, jti):
+        if self.shared is not None:
+            return jti is not None and self.shared.get(f'revoked:{jti}') is not None
+        return jti in self.revoked
+
+    def revoke(self, token):
+        """Reject this token from now on, until it would have expired anyway."""
+        try:
+            claims = self.verify(token)
+        except jwt.InvalidTokenError:
+            return
+        self.verified.delete(hashlib.sha256(token.encode('utf-8')).digest())
+        if 'jti' not in claims:
+            return
+
+        now = time.time()
+        if self.shared is not None:
+            self.shared.set(f"revoked:{claims['jti']}", True, ttl=max(claims.get('exp', now) - now, 1))
+            return
+        with self._lock:
+            self.revoked[claims['jti']] = claims.get('exp', now)
+            # Expired tokens fail verification on their own
+            for jti, exp in list(self.revoked.items()):
+                if exp <= now:
+                    del self.revoked[jti]
@@ -0,0 +1,307 @@
+# benchmarks/bench_endpoints.py
+"""
+Load benchmark for every route against a seeded SQLite stand-in database.
+
+Seeds --rows students (reused between runs when the file already holds
+them), then drives each scenario with --concurrency threads, either
+through the Flask test client or, with --wsgi, over HTTP to a local
+threaded server. Prints a JSON report with throughput and p50/p95/p99
+latency per scenario. With --baseline, each scenario is compared with a
+stored report and the exit status is 1 if any p95 regressed by more than
+--tolerance.
+
+Usage: python benchmarks/bench_endpoints.py [--rows 10000] [--requests 200]
+           [--concurrency 8] [--db bench.db] [--wsgi] [--only get_json,search]
+           [--output report.json] [--baseline baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import standin
+
+COURSES = ['Computer Science', 'Information Technology', 'Mathematics', 'Physics',
+           'Biology', 'Chemistry', 'Economics', 'History', 'Philosophy', 'Engineering']
+FIRST_NAMES = ['Ana', 'Ben', 'Carla', 'Dan', 'Eva', 'Femi', 'Gus', 'Hana', 'Ivan', 'Jo',
+               'Kai', 'Lea', 'Maya', 'Nico', 'Omar', 'Pia', 'Quinn', 'Rosa', 'Sami', 'Theo']
+LAST_NAMES = ['Garcia', 'Smith', 'Tanaka', 'Okafor', 'Novak', 'Silva', 'Khan', 'Muller',
+              'Rossi', 'Dubois', 'Kowalski', 'Larsen', 'Reyes', 'Cohen', 'Ivanova']
+
+ADMIN_USER = 'admin'
+ADMIN_PASSWORD = 'password'
+SEED_CHUNK = 10000
+
+# ==================== SEEDING ====================
+def seed(path, rows, rounds, rng):
+    """Create the schema and top the students table up to `rows` rows."""
+    standin.create_schema(path)
+    conn = sqlite3.connect(path)
+    try:
+        existing = conn.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+        if not conn.execute('SELECT 1 FROM users WHERE username = ?', (ADMIN_USER,)).fetchone():
+            hashed = bcrypt.hashpw(ADMIN_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+            conn.execute('INSERT INTO users (username, password) VALUES (?, ?)', (ADMIN_USER, hashed))
+
+        start = time.perf_counter()
+        for offset in range(existing, rows, SEED_CHUNK):
+            conn.executemany(
+                'INSERT INTO students (name, course, age) VALUES (?, ?, ?)',
+                [(f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', rng.choice(COURSES), rng.randint(16, 60))
+                 for _ in range(min(SEED_CHUNK, rows - offset))]
+            )
+        conn.commit()
+        seeded = max(rows - existing, 0)
+        if seeded:
+            print(f'Seeded {seeded} students in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+        return conn.execute('SELECT MIN(id), MAX(id) FROM students').fetchone()
+    finally:
+        conn.close()
+
+# ==================== CLIENTS ====================
+class TestClient:
+    """Calls the app in-process; one Flask test client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, data=body)
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+    def close(self):
+        pass
+
+class WSGIClient:
+    """Calls a local threaded werkzeug server over keep-alive HTTP."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, body=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.port)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self._local.conn = None
+            conn.close()
+            raise
+
+    def close(self):
+        self.server.shutdown()
+
+# ==================== SCENARIOS ====================
+def build_scenarios(client, id_range, args, rng):
+    """
+    Return [(name, request count, make_request)]; make_request() returns
+    (method, path, headers, body, expected statuses).
+    """
+    low, high = id_range
+    lock = threading.Lock()
+    # Deletes consume the highest ids; everything else reads below them
+    delete_ids = list(range(high, max(high - args.requests, low - 1), -1))
+    stable_high = max(low, high - len(delete_ids))
+
+    credentials = base64.b64encode(f'{ADMIN_USER}:{ADMIN_PASSWORD}'.encode()).decode()
+    status, body = client.request('POST', '/api/login', {'Authorization': f'Basic {credentials}'})
+    if status != 200:
+        raise SystemExit(f'Login failed with {status}: {body[:200]!r}')
+    auth = {'Authorization': 'Bearer ' + json.loads(body)['token']}
+    json_auth = dict(auth, **{'Content-Type': 'application/json'})
+
+    def some_id():
+        with lock:
+            return rng.randint(low, stable_high)
+
+    def some_term():
+        with lock:
+            return rng.choice(FIRST_NAMES + LAST_NAMES)
+
+    def student_body():
+        with lock:
+            return json.dumps({'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                               'course': rng.choice(COURSES), 'age': rng.randint(16, 60)})
+
+    def next_delete_id():
+        with lock:
+            return delete_ids.pop() if delete_ids else stable_high
+
+    full = max(1, args.export_requests)
+    scenarios = [
+        ('list_page_json', args.requests, lambda: ('GET', f'/api/students?limit=100&after={some_id()}', None, None, (200,))),
+        ('list_page_xml', args.requests, lambda: ('GET', f'/api/students?limit=100&after={some_id()}&format=xml', None, None, (200,))),
+        ('export_json', full, lambda: ('GET', '/api/students', None, None, (200,))),
+        ('export_xml', full, lambda: ('GET', '/api/students?format=xml', None, None, (200,))),
+        ('get_json', args.requests, lambda: ('GET', f'/api/students/{some_id()}', None, None, (200,))),
+        ('get_xml', args.requests, lambda: ('GET', f'/api/students/{some_id()}?format=xml', None, None, (200,))),
+        ('search', args.requests, lambda: ('GET', f'/api/students/search?q={some_term()}', None, None, (200,))),
+        ('students_html_search', args.requests, lambda: ('GET', f'/students?q={some_term()}', None, None, (200,))),
+        ('students_html', full, lambda: ('GET', '/students', None, None, (200,))),
+        ('create', args.requests, lambda: ('POST', '/api/students', {'Content-Type': 'application/json'}, student_body(), (201,))),
+        ('update', args.requests, lambda: ('PUT', f'/api/students/{some_id()}', json_auth, student_body(), (200,))),
+        ('delete', len(delete_ids), lambda: ('DELETE', f'/api/students/{next_delete_id()}?confirm=true', auth, None, (204, 404))),
+        ('login', args.login_requests, lambda: ('POST', '/api/login', {'Authorization': f'Basic {credentials}'}, None, (200,))),
+    ]
+    if args.only:
+        wanted = set(args.only.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario[0] in wanted]
+    return scenarios
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_scenario(client, count, make_request, concurrency):
+    def one():
+        method, path, headers, body, expected = make_request()
+        start = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, headers, body)
+        except Exception:
+            status = None
+        return time.perf_counter() - start, status in expected
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: one(), range(count)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds for seconds, _ in results)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': count,
+        'errors': sum(1 for _, ok in results if not ok),
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None)
+    }
+
+# ==================== BASELINE ====================
+def compare(report, baseline, tolerance):
+    """Per-scenario p95 and throughput ratios against a baseline report."""
+    comparison = {}
+    regressions = []
+    for name, result in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not before.get('p95_ms') or not result['p95_ms']:
+            continue
+        p95_ratio = result['p95_ms'] / before['p95_ms']
+        comparison[name] = {
+            'p95_ratio': round(p95_ratio, 3),
+            'throughput_ratio': round(result['throughput_rps'] / before['throughput_rps'], 3)
+            if before.get('throughput_rps') else None,
+            'regressed': p95_ratio > 1 + tolerance
+        }
+        if comparison[name]['regressed']:
+            regressions.append(name)
+    return comparison, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='students to seed (10k-1M)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--export-requests', type=int, default=5, help='requests for full-table scenarios')
+    parser.add_argument('--login-requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--db', help='stand-in database file (kept and reused); default is a temp file')
+    parser.add_argument('--wsgi', action='store_true', help='go through a local HTTP server')
+    parser.add_argument('--bcrypt-rounds', type=int, default=None, help='override BCRYPT_ROUNDS')
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    from app import Config, create_app
+    config = {
+        # The benchmark measures the endpoints, not the login throttle
+        'AUTH_RATE_PER_SECOND': 1e9,
+        'AUTH_BURST': 1e9,
+        'SLOW_REQUEST_SECONDS': None,
+        'DATABASE_STANDIN': path,
+        'MYSQL_POOL_MAX_SIZE': max(Config.MYSQL_POOL_MAX_SIZE, args.concurrency)
+    }
+    if args.bcrypt_rounds:
+        config['BCRYPT_ROUNDS'] = args.bcrypt_rounds
+    app = create_app(config)
+
+    id_range = seed(path, args.rows, app.config['BCRYPT_ROUNDS'], rng)
+    client = WSGIClient(app) if args.wsgi else TestClient(app)
+
+    report = {
+        'meta': {
+            'rows': args.rows,
+            'concurrency': args.concurrency,
+            'client': 'wsgi' if args.wsgi else 'test_client',
+            'database': 'standin',
+            'python': platform.python_version(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'scenarios': {}
+    }
+    try:
+        for name, count, make_request in build_scenarios(client, id_range, args, rng):
+            if count < 1:
+                continue
+            print(f'Running {name} ({count} requests)...', file=sys.stderr)
+            report['scenarios'][name] = run_scenario(client, count, make_request, args.concurrency)
+    finally:
+        client.close()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['comparison'], regressions = compare(report, json.load(f), args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if regressions:
+        print(f'p95 regressions beyond {args.tolerance:.0%}: {", ".join(regressions)}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_serializers.py
+"""
+Encode time and payload size of every registered serializer on student rows.
+
+Rows mode is what list and export responses use (tuples straight from a
+cursor); document mode encodes a page dict as one value.
+
+Usage: python benchmarks/bench_serializers.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import serializers
+from repository import STUDENT_COLUMNS
+
+
+def make_rows(count):
+    return [(i, f'Student <{i}> & Co', 'Computer Science', 16 + i % 45) for i in range(1, count + 1)]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def payload_size(chunks):
+    return sum(len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk) for chunk in chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    document = {'students': [dict(zip(STUDENT_COLUMNS, row)) for row in rows], 'next_cursor': None}
+
+    print(f'{args.rows} rows, best of {args.repeat}')
+    print(f"  {'format':<8} {'mode':<9} {'time':>11} {'size':>12}")
+    for name, serializer in serializers.SERIALIZERS.items():
+        modes = [('rows', lambda: serializer.rows(STUDENT_COLUMNS, rows))]
+        if not serializer.tabular:
+            modes.append(('document', lambda: serializer.document(document)))
+        for mode, encode in modes:
+            seconds = best_of(args.repeat, lambda: payload_size(encode()))
+            size = payload_size(encode())
+            print(f'  {name:<8} {mode:<9} {seconds * 1000:8.2f} ms {size / 1024:9.1f} KiB')
+    if serializers.msgpack is None:
+        print('  (msgpack is not installed)')
+
+
+if __name__ == '__main__':
+    main()
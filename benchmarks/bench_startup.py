@@ -0,0 +1,69 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start time: a fresh interpreter importing app and calling create_app.
+
+Reports the whole process (interpreter start to exit) and the two phases
+the app measures itself, also exported at /metrics as app_startup_seconds.
+--modules lists the slowest modules app and routes import, from one run (python -X importtime).
+
+Usage: python benchmarks/bench_startup.py [--repeat 10] [--modules 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = 'import json, app; app.create_app(); print(json.dumps(app.metrics.startup))'
+
+
+def run_once(extra_args=()):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *extra_args, '-c', SCRIPT], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result
+
+
+def slowest_imports(count):
+    _, result = run_once(['-X', 'importtime'])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # What app and routes import directly; deeper modules are
+        # already inside these totals
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--modules', type=int, default=15)
+    args = parser.parse_args()
+
+    timings = {'process': [], 'import': [], 'create_app': []}
+    for _ in range(args.repeat):
+        seconds, result = run_once()
+        phases = json.loads(result.stdout)
+        timings['process'].append(seconds)
+        for phase, value in phases.items():
+            timings[phase].append(value)
+
+    print(f'{args.repeat} cold starts')
+    for name, values in timings.items():
+        print(f'  {name:<11} best {min(values) * 1000:8.1f} ms  median {statistics.median(values) * 1000:8.1f} ms')
+
+    if args.modules:
+        print('Slowest imports made by app and routes (one run)')
+        for microseconds, name in slowest_imports(args.modules):
+            print(f'  {microseconds / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
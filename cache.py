@@ -0,0 +1,317 @@
+# cache.py
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# A cached read: the data plus a strong validator computed when it was loaded
+CacheEntry = namedtuple('CacheEntry', ['etag', 'data'])
+
+def make_etag(data):
+    """Strong validator for a piece of JSON-serialisable data."""
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+# ==================== BACKENDS ====================
+class CacheBackend:
+    """
+    Storage interface used by StudentCache. A shared backend (Redis,
+    memcached, ...) only needs to implement these methods so that every
+    worker process sees the same entries and invalidations; it sets
+    shared = True, which also moves token revocations, login throttling
+    and events onto it (see create_app).
+    """
+    shared = False
+
+    def get(self, key):
+        """Return the stored value or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def update(self, key, func, ttl=None):
+        """
+        Store func(current value or None) and return it; None deletes the
+        key. A shared backend must do this atomically across processes,
+        and func may read other keys, which stay as they are until it
+        returns.
+        """
+        value = func(self.get(key))
+        if value is None:
+            self.delete(key)
+        else:
+            self.set(key, value, ttl)
+        return value
+
+    def __len__(self):
+        return 0
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def update(self, key, func, ttl=None):
+        with self._lock:
+            return super().update(key, func, ttl)
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a SQLite file, shared by every process that opens the same
+    path, e.g. serve.py's workers on one host. Values are pickled, so
+    only point it at a file the application's user owns. Entries expire
+    after their time to live and are not evicted otherwise.
+    """
+    shared = True
+    # Expired rows are deleted every this many writes
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, ttl=300, timeout=5):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._connection()
+
+    def _connection(self):
+        # One connection per thread, and none inherited across fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._store(self._connection(), key, value, ttl)
+
+    def _store(self, conn, key, value, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM cache WHERE expires_at < ?', (time.time(),))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def update(self, key, func, ttl=None):
+        conn = self._connection()
+        # Takes the write lock up front, so no other process reads in between
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            value = func(self.get(key))
+            if value is None:
+                conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            else:
+                self._store(conn, key, value, ttl)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return value
+
+    def __len__(self):
+        row = self._connection().execute('SELECT COUNT(*) FROM cache WHERE expires_at IS NULL OR expires_at >= ?',
+                                         (time.time(),)).fetchone()
+        return row[0]
+
+# ==================== STUDENT CACHE ====================
+class StudentCache:
+    """
+    Read-through cache between the routes and MySQL.
+
+    Single students are keyed by id and dropped when that student changes.
+    List pages are keyed under a generation number that every write bumps,
+    so one write invalidates all pages without enumerating them.
+    """
+    GENERATION_KEY = 'students:generation'
+
+    def __init__(self, app=None, backend=None):
+        self.backend = self._given_backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_MAX_ENTRIES', 10000)
+        app.config.setdefault('CACHE_TTL', 300)
+        app.config.setdefault('CACHE_BACKEND', None)
+
+        if self._given_backend is None:
+            backend = app.config['CACHE_BACKEND']
+            if isinstance(backend, str):
+                # A file path, e.g. STUDENT_API_CACHE_BACKEND=/var/cache/students.db
+                backend = SQLiteCache(backend, app.config['CACHE_TTL'])
+            if backend is None:
+                backend = LRUCache(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'])
+            self.backend = backend
+
+    def get_or_load(self, key, loader, etag=make_etag):
+        """
+        Return the CacheEntry for key, calling loader() on a miss.
+        loader returns the data to cache, or None for "does not exist"
+        (which is not cached). etag(data) computes the entry's validator.
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        with self._lock:
+            self.misses += 1
+        # Counted in the backend, so writes from every worker are seen
+        writes = self.backend.get(self._writes_key(key))
+
+        data = loader()
+        if data is None:
+            return None
+        entry = CacheEntry(etag(data), data)
+
+        def store(current):
+            # A write that landed while loading (e.g. an update writing
+            # version N+1 through) wins; what was read may be version N
+            if self.backend.get(self._writes_key(key)) != writes:
+                return current
+            return entry
+        self.backend.update(key, store)
+        return entry
+
+    def get_many(self, keys):
+        """{key: CacheEntry} for the keys that are cached; counts lookups."""
+        found = {}
+        for key in keys:
+            entry = self.backend.get(key)
+            if entry is not None:
+                found[key] = entry
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def peek(self, key):
+        """The cached CacheEntry for key or None, without counting a lookup."""
+        return self.backend.get(key)
+
+    def put(self, key, data, etag):
+        """Write a freshly known value through, e.g. the result of an update."""
+        entry = CacheEntry(etag, data)
+        self._written(key)
+        self.backend.set(key, entry)
+        return entry
+
+    # ---- keys ----
+    def student_key(self, student_id):
+        return f'student:{student_id}'
+
+    def list_key(self, *parts):
+        return ':'.join(['students', str(self._generation())] + [str(p) for p in parts])
+
+    def _generation(self):
+        generation = self.backend.get(self.GENERATION_KEY)
+        if generation is None:
+            # Seed from the clock so an evicted counter never reuses old keys
+            generation = time.time_ns()
+            self.backend.set(self.GENERATION_KEY, generation, ttl=0)
+        return generation
+
+    # ---- invalidation ----
+    def invalidate_lists(self):
+        self.backend.set(self.GENERATION_KEY, max(self._generation() + 1, time.time_ns()), ttl=0)
+
+    def invalidate_student(self, student_id):
+        self.invalidate_students([student_id])
+
+    def invalidate_students(self, student_ids):
+        for student_id in student_ids:
+            key = self.student_key(student_id)
+            self._written(key)
+            self.backend.delete(key)
+        self.invalidate_lists()
+
+    def _written(self, key):
+        """Tell loads of key already under way not to store what they read."""
+        self.backend.update(self._writes_key(key), lambda count: (count or 0) + 1)
+
+    def _writes_key(self, key):
+        return f'writes:{key}'
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else None
+        }
@@ -0,0 +1,236 @@
+# compression.py
+import threading
+import zlib
+
+from flask import Response, g, request
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Server preference when the client accepts several codings equally
+ENCODINGS = ('br', 'gzip', 'deflate')
+
+COMPRESSIBLE_MIMETYPES = (
+    'application/json',
+    'application/xml',
+    'application/x-ndjson',
+    'text/csv',
+    'text/html',
+    'text/plain',
+    'text/xml'
+)
+
+def encoder(encoding, level):
+    """(compress, flush, finish) callables for one response body."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits 31 writes a gzip header and trailer, 15 the zlib format that
+    # HTTP calls "deflate"
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def compress_bytes(data, encoding, level):
+    compress, _, finish = encoder(encoding, level)
+    return compress(data) + finish()
+
+class Compressor:
+    """
+    Negotiated gzip/deflate (and brotli when the module is installed)
+    compression of responses.
+
+    Buffered bodies under COMPRESS_MIN_SIZE are sent as they are. A
+    streamed body is compressed chunk by chunk as it is produced, never
+    held in full; the coding is chosen from the headers alone, since
+    reading ahead to learn its size would run the view's work (e.g. the
+    /students page query) before the first byte goes out. Server-Sent
+    Events are left alone; they need a flush per event.
+
+    Responses carrying an ETag are stored compressed under their URL,
+    ETag and coding, so a hit skips both serialization (see
+    conditional_response) and compression. A compressed response's ETag
+    is made weak, which still answers If-None-Match.
+    """
+    def __init__(self, app=None):
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVELS', {'br': 4, 'gzip': 6, 'deflate': 6})
+        app.config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES)
+        app.config.setdefault('COMPRESS_CACHE_ENTRIES', 1000)
+        app.config.setdefault('COMPRESS_CACHE_MAX_BYTES', 1024 * 1024)
+        app.config.setdefault('COMPRESS_CACHE_TTL', 300)
+
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.levels = app.config['COMPRESS_LEVELS']
+        self.mimetypes = set(app.config['COMPRESS_MIMETYPES'])
+        self.cache_max_bytes = app.config['COMPRESS_CACHE_MAX_BYTES']
+        self.store = LRUCache(app.config['COMPRESS_CACHE_ENTRIES'], app.config['COMPRESS_CACHE_TTL'])
+        self.encodings = [e for e in ENCODINGS if e in self.levels and (e != 'br' or brotli is not None)]
+
+        self.enabled = app.config['COMPRESS_ENABLED']
+        if self.enabled:
+            app.after_request(self.compress)
+
+    # ---- negotiation ----
+    def choose(self):
+        """The best coding the client accepts, or None."""
+        accepted = request.accept_encodings
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accepted.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def store_key(self, encoding, etag):
+        return (encoding, request.full_path, etag)
+
+    # ---- pre-compressed representations ----
+    def cached_response(self, etag):
+        """
+        The stored compressed body for this URL and ETag as a Response,
+        or None. Called by routes before they serialize anything.
+        """
+        if not self.enabled:
+            return None
+        encoding = self.choose()
+        if encoding is None:
+            return None
+        stored = self.store.get(self.store_key(encoding, etag))
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        content_type, body = stored
+        response = Response(body, content_type=content_type)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        g.compressed_hit = True
+        return response
+
+    # ---- hook ----
+    def compress(self, response):
+        if g.pop('compressed_hit', False):
+            self.weaken_etag(response)
+            return response
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers):
+            return response
+
+        encoding = self.choose()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            self.compress_stream(response, encoding)
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        body = compress_bytes(data, encoding, self.levels[encoding])
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        self.count(len(data), len(body))
+        self.remember(response, encoding, body)
+        self.weaken_etag(response)
+        return response
+
+    def compress_stream(self, response, encoding):
+        body = response.response
+        chunks = response.iter_encoded()
+        compress, flush, finish = encoder(encoding, self.levels[encoding])
+        key = self.store_key(encoding, response.get_etag()[0]) if self.storable(response) else None
+        content_type = response.headers.get('Content-Type')
+
+        def generate():
+            size_in = size_out = 0
+            kept = [] if key is not None else None
+            try:
+                for chunk in chunks:
+                    first = size_in == 0
+                    size_in += len(chunk)
+                    out = compress(chunk)
+                    if first:
+                        # Send the first chunk right away (e.g. a page's
+                        # header while its query runs); the rest flows at
+                        # the compressor's own pace
+                        out += flush()
+                    if out:
+                        size_out += len(out)
+                        if kept is not None:
+                            kept.append(out)
+                            if size_out > self.cache_max_bytes:
+                                kept = None
+                        yield out
+                out = finish()
+                size_out += len(out)
+                yield out
+                self.count(size_in, size_out)
+                if kept is not None and size_out <= self.cache_max_bytes:
+                    kept.append(out)
+                    self.store.set(key, (content_type, b''.join(kept)))
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+
+        response.response = generate()
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        self.weaken_etag(response)
+
+    def storable(self, response):
+        return request.method == 'GET' and response.status_code == 200 and response.get_etag()[0] is not None
+
+    def remember(self, response, encoding, body):
+        if self.storable(response) and len(body) <= self.cache_max_bytes:
+            key = self.store_key(encoding, response.get_etag()[0])
+            self.store.set(key, (response.headers.get('Content-Type'), body))
+
+    @staticmethod
+    def weaken_etag(response):
+        """A compressed body is a different byte sequence from the plain one."""
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+
+    # ---- reporting ----
+    def count(self, size_in, size_out):
+        with self._lock:
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+
+    def stats(self):
+        with self._lock:
+            return {
+                'encodings': self.encodings,
+                'entries': len(self.store),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None
+            }
+
+    def reset(self):
+        self.store.clear()
+        with self._lock:
+            self.hits = self.misses = self.bytes_in = self.bytes_out = 0
@@ -0,0 +1,520 @@
+# db.py
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, request
+
+from cache import LRUCache
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout."""
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# ==================== CONNECTION FACTORIES ====================
+def connect_mysql(host, user, password, db=None, port=3306):
+    """
+    Open a MySQL connection with mysqlclient (MySQLdb). FOUND_ROWS makes
+    UPDATE report matched rather than changed rows, so a rowcount of 0
+    always means "no such row".
+    """
+    import MySQLdb
+    from MySQLdb.constants import CLIENT
+
+    kwargs = {'host': host, 'user': user, 'passwd': password, 'port': port,
+              'charset': 'utf8mb4', 'client_flag': CLIENT.FOUND_ROWS}
+    if db:
+        kwargs['db'] = db
+    return MySQLdb.connect(**kwargs)
+
+def connector_from_config(config):
+    """
+    Return a zero-argument function that opens one connection, either to
+    MySQL or, when DATABASE_STANDIN is set, to the local SQLite stand-in.
+    """
+    if config.get('DATABASE_STANDIN'):
+        import standin
+        path = config['DATABASE_STANDIN']
+        return lambda: standin.connect(path)
+
+    return lambda: connect_mysql(
+        config['MYSQL_HOST'], config['MYSQL_USER'], config['MYSQL_PASSWORD'],
+        config['MYSQL_DB'], config.get('MYSQL_PORT', 3306)
+    )
+
+def replica_connectors(config):
+    """
+    [(name, weight, connect)] for the configured read replicas.
+    MYSQL_REPLICAS entries are dicts with a host and optional port, user,
+    password, db and weight; anything missing is taken from the primary.
+    With DATABASE_STANDIN, DATABASE_STANDIN_REPLICAS lists file paths
+    (or {'path': ..., 'weight': ...}) instead.
+    """
+    replicas = []
+    if config.get('DATABASE_STANDIN'):
+        import standin
+        for entry in config.get('DATABASE_STANDIN_REPLICAS') or []:
+            entry = entry if isinstance(entry, dict) else {'path': entry}
+            path = entry['path']
+            replicas.append((path, entry.get('weight', 1), lambda path=path: standin.connect(path)))
+        return replicas
+
+    for entry in config.get('MYSQL_REPLICAS') or []:
+        settings = {
+            'host': entry['host'],
+            'user': entry.get('user', config['MYSQL_USER']),
+            'password': entry.get('password', config['MYSQL_PASSWORD']),
+            'db': entry.get('db', config['MYSQL_DB']),
+            'port': entry.get('port', config.get('MYSQL_PORT', 3306))
+        }
+        name = f"{settings['host']}:{settings['port']}"
+        replicas.append((name, entry.get('weight', 1), lambda settings=settings: connect_mysql(**settings)))
+    return replicas
+
+# ==================== POOL ====================
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections.
+
+    Idle connections are reused most-recently-used first. On checkout a
+    connection older than `recycle` seconds is replaced, and with
+    `pre_ping` one that fails ping() is replaced too. When max_size
+    connections are checked out, callers wait up to `timeout` seconds
+    and then get PoolTimeout.
+    """
+    def __init__(self, connect, min_size=1, max_size=10, recycle=3600, pre_ping=True, timeout=5.0):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._born = {}
+        self._size = 0
+        self._filled = False
+        self._cond = threading.Condition()
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.ping_failures = 0
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:
+            self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _fill(self):
+        # Warm up to min_size on first use rather than at import time
+        with self._cond:
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+            self._filled = True
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def acquire(self):
+        """Check out a healthy connection. Returns (connection, seconds waited)."""
+        if not self._filled:
+            self._fill()
+
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'No connection available within {self.timeout}s '
+                                      f'({self.max_size} in use)')
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                conn = self._open()
+            else:
+                conn = self._validate(conn)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        wait = time.perf_counter() - start
+        with self._cond:
+            self.checkouts += 1
+            self.waits += waited
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        return conn, wait
+
+    def _validate(self, conn):
+        """Replace a connection that is too old or fails a ping."""
+        if self.recycle and time.monotonic() - self._born.get(id(conn), 0) > self.recycle:
+            with self._cond:
+                self.recycled += 1
+            self._discard(conn)
+            return self._open()
+
+        if self.pre_ping:
+            try:
+                conn.ping()
+            except Exception:
+                with self._cond:
+                    self.ping_failures += 1
+                self._discard(conn)
+                return self._open()
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection; any open transaction is rolled back."""
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._discard(conn)
+        with self._cond:
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with block."""
+        conn, _ = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._size -= len(idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_seconds_total': round(self.wait_seconds, 6),
+                'wait_seconds_max': round(self.max_wait_seconds, 6),
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'recycled': self.recycled,
+                'ping_failures': self.ping_failures
+            }
+
+# ==================== REPLICAS ====================
+class ReplicaSet:
+    """
+    Read replicas chosen by smooth weighted round-robin. A replica whose
+    checkout fails is ejected for `eject_seconds` and then tried again.
+    """
+    def __init__(self, replicas, eject_seconds=30):
+        # replicas: [(name, weight, pool)]
+        self.replicas = [
+            {'name': name, 'weight': weight, 'pool': pool, 'current': 0,
+             'ejected_until': 0.0, 'failures': 0, 'checkouts': 0}
+            for name, weight, pool in replicas
+        ]
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+
+    def choose(self, exclude=()):
+        """
+        The next healthy replica (a dict), or None if all are ejected.
+        exclude holds id()s of replicas already tried for this request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy = [r for r in self.replicas
+                       if r['ejected_until'] <= now and id(r) not in exclude]
+            if not healthy:
+                return None
+            total = sum(r['weight'] for r in healthy)
+            for replica in healthy:
+                replica['current'] += replica['weight']
+            chosen = max(healthy, key=lambda r: r['current'])
+            chosen['current'] -= total
+            chosen['checkouts'] += 1
+            return chosen
+
+    def eject(self, replica):
+        with self._lock:
+            replica['failures'] += 1
+            replica['ejected_until'] = time.monotonic() + self.eject_seconds
+            replica['current'] = 0
+
+    def close(self):
+        for replica in self.replicas:
+            replica['pool'].close()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'name': r['name'],
+                'weight': r['weight'],
+                'healthy': r['ejected_until'] <= now,
+                'failures': r['failures'],
+                'checkouts': r['checkouts'],
+                'pool': r['pool'].stats()
+            } for r in self.replicas]
+
+# ==================== FLASK INTEGRATION ====================
+class Database:
+    """
+    Replacement for flask_mysqldb.MySQL backed by a ConnectionPool.
+
+    `db.connection` checks a connection out once per application context
+    and returns it to the pool on teardown. The pool is built on first
+    use, so configuration may change until the first query.
+
+    `db.cursor(read_only=True)` may be served by a read replica instead.
+    Writes always use the primary. After a client's successful write
+    (any non-GET request that used the primary), reads from that client
+    stay on the primary for MYSQL_PRIMARY_PIN_SECONDS, so they see
+    their own write. Reads that fill the shared cache
+    (cacheable=True) also stay on the primary for that window after any
+    write, so stale replica rows are never cached. Given a shared
+    CacheBackend, both pins live there and hold in every worker.
+    """
+    LAST_WRITE_KEY = 'db:last_write'
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pool = None
+        self._replicas = None
+        self._lock = threading.Lock()
+        # Optional hook applied to every cursor (see metrics.TimedCursor)
+        self.wrap_cursor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, shared=None):
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_POOL_MIN_SIZE', 2)
+        app.config.setdefault('MYSQL_POOL_MAX_SIZE', 10)
+        app.config.setdefault('MYSQL_POOL_RECYCLE', 3600)
+        app.config.setdefault('MYSQL_POOL_PRE_PING', True)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 5.0)
+        app.config.setdefault('DATABASE_STANDIN', None)
+        app.config.setdefault('MYSQL_REPLICAS', [])
+        app.config.setdefault('DATABASE_STANDIN_REPLICAS', [])
+        app.config.setdefault('MYSQL_REPLICA_EJECT_SECONDS', 30)
+        app.config.setdefault('MYSQL_PRIMARY_PIN_SECONDS', 5)
+
+        if self.app is not None:
+            # Bound to a new application: drop pools built from the old config
+            self.reset()
+        self.app = app
+        self.shared = shared is not None
+        self.pin_seconds = app.config['MYSQL_PRIMARY_PIN_SECONDS']
+        self.pins = shared if self.shared else LRUCache(max_entries=100000, ttl=self.pin_seconds)
+        app.teardown_appcontext(self.teardown)
+        app.after_request(self.checkout_timing)
+        app.after_request(self.pin_writer)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    config = self.app.config
+                    self._pool = ConnectionPool(
+                        connector_from_config(config),
+                        min_size=config['MYSQL_POOL_MIN_SIZE'],
+                        max_size=config['MYSQL_POOL_MAX_SIZE'],
+                        recycle=config['MYSQL_POOL_RECYCLE'],
+                        pre_ping=config['MYSQL_POOL_PRE_PING'],
+                        timeout=config['MYSQL_POOL_TIMEOUT']
+                    )
+        return self._pool
+
+    @property
+    def replicas(self):
+        if self._replicas is None:
+            with self._lock:
+                if self._replicas is None:
+                    config = self.app.config
+                    self._replicas = ReplicaSet([
+                        (name, weight, ConnectionPool(
+                            connect,
+                            min_size=0,
+                            max_size=config['MYSQL_POOL_MAX_SIZE'],
+                            recycle=config['MYSQL_POOL_RECYCLE'],
+                            pre_ping=config['MYSQL_POOL_PRE_PING'],
+                            timeout=config['MYSQL_POOL_TIMEOUT']
+                        ))
+                        for name, weight, connect in replica_connectors(config)
+                    ], eject_seconds=config['MYSQL_REPLICA_EJECT_SECONDS'])
+        return self._replicas
+
+    @property
+    def standin(self):
+        return bool(self.app.config['DATABASE_STANDIN'])
+
+    @property
+    def connection(self):
+        if 'db_connection' not in g:
+            g.db_connection, g.db_checkout_wait = self.pool.acquire()
+        return g.db_connection
+
+    @property
+    def read_connection(self):
+        """A replica connection for this request, or the primary's."""
+        if 'db_read_connection' not in g:
+            g.db_read_connection = self._checkout_replica()
+        return g.db_read_connection[1] if g.db_read_connection else self.connection
+
+    def _checkout_replica(self):
+        tried = []
+        while True:
+            replica = self.replicas.choose(exclude=tried)
+            if replica is None:
+                return None
+            try:
+                conn, _ = replica['pool'].acquire()
+                return replica['pool'], conn
+            except Exception as e:
+                self.replicas.eject(replica)
+                tried.append(id(replica))
+                self.app.logger.warning('Ejected replica %s: %s', replica['name'], e)
+
+    def use_primary_for_reads(self, cacheable=False):
+        """True when reads must see writes the replicas may not have yet."""
+        if not self.replicas.replicas or 'db_connection' in g:
+            return True
+        if cacheable and self.pins.get(self.LAST_WRITE_KEY) is not None:
+            return True
+        return self.pins.get(self.pin_key()) is not None
+
+    def cursor(self, streaming=False, read_only=False, cacheable=False):
+        """
+        A cursor on the request's connection; streaming=True reads rows
+        lazily. read_only=True allows a replica (see the class docstring).
+        """
+        if read_only and not self.use_primary_for_reads(cacheable):
+            conn = self.read_connection
+        else:
+            conn = self.connection
+
+        if streaming and not self.standin:
+            import MySQLdb.cursors
+            cursor = conn.cursor(MySQLdb.cursors.SSCursor)
+        else:
+            cursor = conn.cursor()
+        return self.wrap_cursor(cursor) if self.wrap_cursor else cursor
+
+    def client_key(self):
+        """Who 'this client' is for read-your-writes: token, else address."""
+        return request.headers.get('Authorization') or request.remote_addr
+
+    def pin_key(self):
+        # Hashed: a shared backend is a file, and this may be a credential
+        digest = hashlib.sha1(self.client_key().encode('utf-8')).hexdigest()
+        return f'pin:{digest}'
+
+    def pin_writer(self, response):
+        """After a successful write, keep this client's reads on the primary."""
+        if (request.method not in SAFE_METHODS and 'db_connection' in g
+                and response.status_code < 400 and self.replicas.replicas):
+            self.pins.set(self.LAST_WRITE_KEY, True, ttl=self.pin_seconds)
+            self.pins.set(self.pin_key(), True, ttl=self.pin_seconds)
+        return response
+
+    def checkout_timing(self, response):
+        """Report this request's pool wait as a Server-Timing metric."""
+        wait = g.get('db_checkout_wait')
+        if wait is not None:
+            response.headers.add('Server-Timing', f'db-checkout;dur={wait * 1000:.2f}')
+        return response
+
+    def detach(self):
+        """
+        Take this request's connections away from teardown, which runs
+        before a streamed body is read. Returns the function that releases
+        them; register it with response.call_on_close.
+        """
+        conn = g.pop('db_connection', None)
+        checkout = g.pop('db_read_connection', None)
+
+        def release():
+            if conn is not None:
+                self.pool.release(conn)
+            if checkout:
+                pool, read_conn = checkout
+                pool.release(read_conn)
+        return release
+
+    def teardown(self, exception):
+        self.detach()()
+
+    def stats(self):
+        stats = self.pool.stats()
+        if self.replicas.replicas:
+            stats['replicas'] = self.replicas.stats()
+        return stats
+
+    def reset(self):
+        """Close the pools so the next query rebuilds them from config."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+            if self._replicas is not None:
+                self._replicas.close()
+            self._pool = None
+            self._replicas = None
+            if not self.shared:
+                self.pins.clear()
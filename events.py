@@ -0,0 +1,272 @@
+# events.py
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+class TooManySubscribers(Exception):
+    pass
+
+# ==================== SUBSCRIPTIONS ====================
+class Subscription:
+    """One connected client: a bounded queue the broker pushes into."""
+
+    def __init__(self, broker, max_queue):
+        self.broker = broker
+        self.queue = queue.Queue(max_queue)
+        self.evicted = False
+        self.closed = False
+
+    def push(self, event):
+        """Non-blocking; a full queue means the client cannot keep up."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.evicted = True
+            return False
+
+    def stream(self, ping_interval, replay=()):
+        """
+        Yield SSE text: replayed events, then live ones, with a comment
+        line every ping_interval seconds of silence so proxies keep the
+        connection open. Ends when the subscriber is evicted.
+        """
+        try:
+            yield f'retry: {self.broker.retry_ms}\n\n'
+            for event in replay:
+                yield format_event(event)
+            while not self.closed:
+                try:
+                    event = self.queue.get(timeout=ping_interval)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                if event is None:
+                    break
+                yield format_event(event)
+            if self.evicted:
+                # The client reconnects with Last-Event-ID and is replayed
+                yield format_event((None, 'evicted', {'reason': 'slow consumer'}))
+        finally:
+            self.broker.unsubscribe(self)
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+def format_event(event):
+    event_id, event_type, data = event
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event_type}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+# ==================== BROKER ====================
+class EventBroker:
+    """
+    In-process fan-out of student change events to SSE subscribers.
+
+    Each subscriber has a queue of EVENTS_QUEUE_SIZE events. A subscriber
+    whose queue is full when an event is published is evicted rather than
+    slowing the publisher. The last EVENTS_BUFFER_SIZE events are kept
+    in a ring buffer, so a client reconnecting with Last-Event-ID gets
+    what it missed. When the id has already left the buffer, the client
+    gets a 'reset' event and should refetch.
+
+    Idle subscribers cost a queue and a blocked thread, not a database
+    query. Without a shared backend, events only reach clients of the
+    process that made the change. With one (see create_app), events are
+    numbered and kept there instead, and each worker with subscribers
+    polls it every EVENTS_POLL_INTERVAL seconds, so clients of every
+    worker see every change and can resume on any of them.
+    """
+    def __init__(self, app=None, shared=None):
+        self.subscribers = set()
+        self.buffer = deque()
+        self.last_id = 0
+        self.published = 0
+        self.evictions = 0
+        self.shared = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._poller = None
+        self._missing = None
+        if hasattr(os, 'register_at_fork'):
+            # Each worker of a pre-forking server numbers its own events
+            os.register_at_fork(after_in_child=self.new_epoch)
+        if app is not None:
+            self.init_app(app, shared)
+
+    def init_app(self, app, shared=None):
+        app.config.setdefault('EVENTS_QUEUE_SIZE', 100)
+        app.config.setdefault('EVENTS_BUFFER_SIZE', 1000)
+        app.config.setdefault('EVENTS_PING_INTERVAL', 15)
+        app.config.setdefault('EVENTS_MAX_SUBSCRIBERS', 1000)
+        app.config.setdefault('EVENTS_RETRY_MS', 3000)
+        app.config.setdefault('EVENTS_POLL_INTERVAL', 0.5)
+
+        self.app = app
+        self.queue_size = app.config['EVENTS_QUEUE_SIZE']
+        self.buffer_size = app.config['EVENTS_BUFFER_SIZE']
+        self.buffer = deque(self.buffer, maxlen=self.buffer_size)
+        self.ping_interval = app.config['EVENTS_PING_INTERVAL']
+        self.max_subscribers = app.config['EVENTS_MAX_SUBSCRIBERS']
+        self.retry_ms = app.config['EVENTS_RETRY_MS']
+        self.poll_interval = app.config['EVENTS_POLL_INTERVAL']
+        self.shared = shared
+        self.new_epoch()
+
+    def new_epoch(self):
+        # Event ids restart with the process; the epoch tells ids apart.
+        # Workers forked in the same millisecond differ by pid. With a
+        # shared backend all workers number events under its epoch.
+        epoch = f'{time.time_ns() // 1000000}.{os.getpid()}'
+        if self.shared is not None:
+            epoch = self.shared.update('events:epoch', lambda current: current or epoch, ttl=0)
+        self.epoch = epoch
+        # Threads do not survive fork
+        self._poller = None
+
+    def publish(self, event_type, data):
+        """Record an event and hand it to every subscriber without blocking."""
+        if self.shared is not None:
+            event_id = self.shared.update('events:last_id', lambda last: (last or 0) + 1, ttl=0)
+            self.shared.set(f'events:{event_id}', (event_type, data), ttl=0)
+            self.shared.delete(f'events:{event_id - self.buffer_size}')
+            with self._lock:
+                self.published += 1
+            # This worker's poller delivers it, in order with everyone else's
+            return
+
+        with self._lock:
+            self.last_id += 1
+            event = (f'{self.epoch}-{self.last_id}', event_type, data)
+            self.buffer.append(event)
+            self.published += 1
+            subscribers = list(self.subscribers)
+
+        for subscription in subscribers:
+            if not subscription.push(event):
+                self.evict(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Return (subscription, replay). replay holds the buffered events
+        after last_event_id, or a single reset event if they are gone.
+        """
+        if self.shared is not None:
+            self._start_poller()
+            # Catch up first: the client may have seen newer ids on another worker
+            self.poll()
+        with self._lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(f'{self.max_subscribers} subscribers connected')
+            subscription = Subscription(self, self.queue_size)
+            self.subscribers.add(subscription)
+            replay = self._replay(last_event_id) if last_event_id else []
+        return subscription, replay
+
+    def _replay(self, last_event_id):
+        epoch, _, seq = last_event_id.partition('-')
+        if self.shared is not None:
+            oldest = max(self.last_id - self.buffer_size, 0) + 1
+        else:
+            oldest = int(self.buffer[0][0].split('-')[1]) if self.buffer else self.last_id + 1
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = -1
+        reset = [(None, 'reset', {'reason': 'events since Last-Event-ID are unavailable'})]
+        if epoch != str(self.epoch) or seq < oldest - 1 or seq > self.last_id:
+            return reset
+        if self.shared is None:
+            return [event for event in self.buffer if int(event[0].split('-')[1]) > seq]
+
+        replay = []
+        for event_id in range(seq + 1, self.last_id + 1):
+            stored = self.shared.get(f'events:{event_id}')
+            if stored is None:
+                return reset
+            replay.append((f'{self.epoch}-{event_id}', *stored))
+        return replay
+
+    # ---- shared backend ----
+    def _start_poller(self):
+        with self._lock:
+            if self._poller is not None:
+                return
+            self.last_id = self.shared.get('events:last_id') or 0
+            self._poller = threading.Thread(target=self._poll_loop, name='events-poller', daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                self.app.logger.warning('Polling for events failed: %s', e)
+
+    def poll(self):
+        """Hand subscribers the events published, by any worker, since the last poll."""
+        with self._poll_lock:
+            last = self.shared.get('events:last_id') or 0
+            # Events this far behind have left the shared buffer
+            seq = max(self.last_id, last - self.buffer_size)
+            events = []
+            while seq < last:
+                stored = self.shared.get(f'events:{seq + 1}')
+                if stored is None and self._missing != seq + 1:
+                    # Numbered but not stored yet: give its publisher one poll
+                    self._missing = seq + 1
+                    break
+                if stored is not None:
+                    events.append((f'{self.epoch}-{seq + 1}', *stored))
+                seq += 1
+
+            # Delivered under the lock, so subscribe() replays exactly up to last_id
+            slow = set()
+            with self._lock:
+                self.last_id = seq
+                for event in events:
+                    for subscription in self.subscribers:
+                        if not subscription.push(event):
+                            slow.add(subscription)
+        for subscription in slow:
+            self.evict(subscription)
+
+    def evict(self, subscription):
+        with self._lock:
+            if subscription not in self.subscribers:
+                return
+            self.subscribers.discard(subscription)
+            self.evictions += 1
+        subscription.close()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+
+    def close_all(self):
+        """End every open stream, e.g. when the worker drains."""
+        with self._lock:
+            subscribers = list(self.subscribers)
+            self.subscribers.clear()
+        for subscription in subscribers:
+            subscription.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'published': self.published,
+                'evictions': self.evictions,
+                'buffered': len(self.buffer),
+                'last_event_id': f'{self.epoch}-{self.last_id}'
+            }
@@ -0,0 +1,263 @@
+# jobs.py
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import repository
+
+class JobCancelled(Exception):
+    pass
+
+class QueueFull(Exception):
+    """Raised by submit when JOBS_MAX_PENDING jobs are already waiting."""
+    def __init__(self, retry_after):
+        super().__init__('Job queue is full')
+        self.retry_after = retry_after
+
+# ==================== JOB HANDLE ====================
+class Job:
+    """
+    What a handler gets: the job's id and parameters, progress reporting
+    and cancellation. progress() writes to the jobs table at most every
+    JOBS_PROGRESS_INTERVAL seconds and raises JobCancelled once a cancel
+    has been requested, so handlers only need to call it between batches.
+    """
+    def __init__(self, queue, job_id, kind, params):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.done = 0
+        self.total = None
+        self.result_file = None
+        self._cancel = threading.Event()
+        self._saved_at = 0.0
+
+    def progress(self, done, total=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if now - self._saved_at >= self.queue.progress_interval:
+            self._saved_at = now
+            with self.queue.db.pool.connection() as conn:
+                cancel_requested = repository.update_job_progress(conn.cursor(), self.id, self.done, self.total)
+                conn.commit()
+            if cancel_requested:
+                self._cancel.set()
+        self.check()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def result_path(self, extension):
+        """Where to write a downloadable result; cleaned up on failure."""
+        self.result_file = f'job-{self.id}.{extension}'
+        return os.path.join(self.queue.directory, self.result_file)
+
+# ==================== QUEUE ====================
+class JobQueue:
+    """
+    In-process background jobs for work too long for a request: exports,
+    mass deletes, re-indexing. Jobs are rows in the jobs table, so their
+    status survives the request and can be read from any process; the
+    work itself runs on JOBS_WORKERS threads of the process that accepted
+    it, each with its own pooled connection. At most JOBS_MAX_PENDING
+    jobs wait; beyond that submit raises QueueFull.
+
+    Handlers are registered per kind with @jobs.handler(kind) and called
+    as handler(job, conn, params); they return a JSON-serialisable result.
+    Queued jobs left by a restart are picked up again when the queue
+    starts; running ones are not resumed.
+    """
+    STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self.handlers = {}
+        self.validators = {}
+        self.running = {}
+        self.completed = 0
+        self._pending = None
+        self._threads = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_MAX_PENDING', 100)
+        app.config.setdefault('JOBS_PROGRESS_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_BATCH_SIZE', 1000)
+        app.config.setdefault('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'student-jobs'))
+
+        self.app = app
+        self.db = db or self.db
+        self.workers = app.config['JOBS_WORKERS']
+        self.progress_interval = app.config['JOBS_PROGRESS_INTERVAL']
+        self.batch_size = app.config['JOBS_BATCH_SIZE']
+        self.directory = app.config['JOBS_DIR']
+        self._pending = queue.Queue(app.config['JOBS_MAX_PENDING'])
+
+    def handler(self, kind, validate=None):
+        """
+        Register a handler for a job kind. validate(params), if given,
+        returns an error message or None and runs when the job is submitted.
+        """
+        def register(f):
+            self.handlers[kind] = f
+            if validate is not None:
+                self.validators[kind] = validate
+            return f
+        return register
+
+    def validate(self, kind, params):
+        if kind not in self.handlers:
+            return f"kind must be one of {', '.join(sorted(self.handlers))}"
+        if not isinstance(params, dict):
+            return 'params must be a JSON object'
+        validate = self.validators.get(kind)
+        return validate(params) if validate else None
+
+    # ---- submitting ----
+    def submit(self, kind, params, created_by=None):
+        """Record a job and queue it; returns its id."""
+        self._start()
+        if self._pending.full():
+            raise QueueFull(retry_after=max(1, int(self.progress_interval * 5)))
+
+        with self.db.pool.connection() as conn:
+            job_id = repository.insert_job(conn.cursor(), kind, params, created_by)
+            conn.commit()
+        try:
+            self._pending.put_nowait(job_id)
+        except queue.Full:
+            self._finish(job_id, 'failed', 0, error='Job queue is full')
+            raise QueueFull(retry_after=max(1, int(self.progress_interval * 5)))
+        return job_id
+
+    def get(self, job_id):
+        with self.db.pool.connection() as conn:
+            return repository.get_job(conn.cursor(), job_id)
+
+    def cancel(self, job_id):
+        """'cancelled' (was queued), 'cancelling' (running), or None (finished)."""
+        with self.db.pool.connection() as conn:
+            outcome = repository.cancel_job(conn.cursor(), job_id)
+            conn.commit()
+        job = self.running.get(job_id)
+        if job is not None:
+            job.cancel()
+        return outcome
+
+    def result_file(self, job):
+        """Path of a finished job's downloadable result, or None."""
+        name = (job.get('result') or {}).get('file')
+        if job['status'] != 'succeeded' or not name:
+            return None
+        path = os.path.join(self.directory, os.path.basename(name))
+        return path if os.path.exists(path) else None
+
+    # ---- workers ----
+    def _start(self):
+        """Start the workers on first use and requeue jobs left queued."""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        with self.db.pool.connection() as conn:
+            leftover = repository.queued_job_ids(conn.cursor())
+        for job_id in leftover:
+            try:
+                self._pending.put_nowait(job_id)
+            except queue.Full:
+                break
+
+    def _work(self):
+        while True:
+            job_id = self._pending.get()
+            try:
+                self._run(job_id)
+            except Exception as e:
+                self.app.logger.warning('Job %s could not be run: %s', job_id, e)
+            finally:
+                self._pending.task_done()
+
+    def _run(self, job_id):
+        with self.db.pool.connection() as conn:
+            cursor = conn.cursor()
+            claimed = repository.claim_job(cursor, job_id)
+            conn.commit()
+            record = repository.get_job(cursor, job_id) if claimed else None
+        if record is None:
+            # Cancelled while queued, or another worker got it first
+            return
+
+        job = Job(self, job_id, record['kind'], record['params'])
+        self.running[job_id] = job
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self.db.pool.connection() as conn:
+                try:
+                    result = self.handlers[job.kind](job, conn, job.params)
+                except BaseException:
+                    conn.rollback()
+                    raise
+            self._finish(job_id, 'succeeded', job.done, result)
+        except JobCancelled:
+            self._discard_result(job)
+            self._finish(job_id, 'cancelled', job.done)
+        except Exception as e:
+            self._discard_result(job)
+            self._finish(job_id, 'failed', job.done, error=str(e))
+            self.app.logger.warning('Job %s (%s) failed: %s', job_id, job.kind, e)
+        finally:
+            self.running.pop(job_id, None)
+            self.completed += 1
+
+    def _finish(self, job_id, status, progress, result=None, error=None):
+        with self.db.pool.connection() as conn:
+            repository.finish_job(conn.cursor(), job_id, status, progress, result, error)
+            conn.commit()
+
+    def _discard_result(self, job):
+        if job.result_file:
+            try:
+                os.remove(os.path.join(self.directory, job.result_file))
+            except OSError:
+                pass
+
+    def join(self):
+        """Block until every queued job has been run (for tests and shutdown)."""
+        self._pending.join()
+
+    def drain(self, timeout):
+        """
+        Wait up to timeout seconds for queued and running jobs to finish,
+        before the process exits. Returns False if some were left; those
+        stay 'queued' or 'running' in the jobs table.
+        """
+        deadline = time.monotonic() + timeout
+        while self._pending is not None and (self._pending.unfinished_tasks or self.running):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def stats(self):
+        return {
+            'workers': len(self._threads),
+            'pending': self._pending.qsize(),
+            'running': sorted(self.running),
+            'completed': self.completed
+        }
@@ -0,0 +1,289 @@
+# metrics.py
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# ==================== HISTOGRAMS ====================
+class Histogram:
+    """
+    Prometheus-style histogram with labels.
+
+    Each thread observes into its own shard, so the hot path is a dict
+    lookup and two additions with no lock. Shards are merged only when
+    /metrics is scraped. When a thread exits (serve.py replaces workers'
+    threads, executors come and go) its shard is folded into a retired
+    total, so the number of shards follows the live threads.
+    """
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        # id(shard) -> shard for live threads; dead threads' series summed
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # Thread-local values are dropped when their thread exits,
+            # which fires the finalizer
+            self._local.owner = owner = ThreadOwner()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            del self._shards[id(shard)]
+            merge_series(self._retired, shard)
+
+    def observe(self, labels, value):
+        """Record one value; labels is a tuple matching label_names."""
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # One slot per bucket plus +Inf, then the running sum
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self):
+        """Merged {labels: (per-bucket counts, sum)} across all threads."""
+        with self._lock:
+            shards = list(self._shards.values())
+            merged = {labels: list(series) for labels, series in self._retired.items()}
+        for shard in shards:
+            merge_series(merged, shard)
+        return {labels: (series[:-1], series[-1]) for labels, series in merged.items()}
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.clear()
+            self._retired.clear()
+
+    def render(self):
+        """This histogram in the Prometheus text exposition format."""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.collect().items()):
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(pairs)} {total!r}')
+            lines.append(f'{self.name}_count{format_labels(pairs)} {cumulative}')
+        return lines
+
+class ThreadOwner:
+    """Weak-referenceable marker stored in a thread's locals."""
+    __slots__ = ('__weakref__',)
+
+def merge_series(total, shard):
+    """Add a shard's {labels: series} into total, in place."""
+    for labels, series in list(shard.items()):
+        into = total.setdefault(labels, [0] * len(series))
+        for i, value in enumerate(series):
+            into[i] += value
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{str(value).translate(LABEL_ESCAPES)}"' for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+LABEL_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n'})
+
+def statement_kind(sql):
+    """SELECT/INSERT/UPDATE/... : a low-cardinality label for a query."""
+    return sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'UNKNOWN'
+
+# ==================== CURSOR ====================
+class TimedCursor:
+    """Wraps a DB-API cursor and reports the duration of every execute."""
+
+    def __init__(self, cursor, record):
+        self._cursor = cursor
+        self._record = record
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            self._record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_of_params)
+        finally:
+            self._record(sql, time.perf_counter() - start)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# ==================== FLASK INTEGRATION ====================
+class Metrics:
+    """
+    Request instrumentation: latency per endpoint, method and status,
+    query count and time per request, and named sections such as
+    serialization and bcrypt. Requests slower than SLOW_REQUEST_SECONDS
+    are logged with their queries, slowest first.
+
+    Streamed responses are measured when the body has been sent, so the
+    histogram covers the whole transfer rather than just the view.
+
+    Everything here is per process. Under serve.py a scrape of /metrics
+    reads whichever worker accepts the connection, so successive scrapes
+    can come from different workers, and a replaced worker starts from
+    zero. Counts can appear to go backwards between scrapes; they are not
+    deployment totals.
+    """
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.requests = Histogram('http_request_duration_seconds',
+                                  'Time from request start to the end of the response body.',
+                                  ('endpoint', 'method', 'status'))
+        self.queries = Histogram('db_query_duration_seconds',
+                                 'Time spent in cursor.execute per statement.',
+                                 ('endpoint', 'statement'))
+        self.query_counts = Histogram('db_queries_per_request',
+                                      'Number of statements executed per request.',
+                                      ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.sections = Histogram('section_duration_seconds',
+                                  'Time spent in named sections such as serialization and bcrypt.',
+                                  ('section', 'label'))
+        self.histograms = [self.requests, self.queries, self.query_counts, self.sections]
+        # Cold-start seconds per phase, set by app.create_app
+        self.startup = {}
+        self.db = db
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('SLOW_REQUEST_SECONDS', 1.0)
+        app.config.setdefault('SLOW_REQUEST_MAX_QUERIES', 20)
+
+        self.app = app
+        self.db = db or self.db
+        self.enabled = app.config['METRICS_ENABLED']
+        if not self.enabled:
+            return
+
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        if self.db is not None:
+            self.db.wrap_cursor = self.wrap_cursor
+
+    # ---- hooks ----
+    def start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = []
+
+    def end_request(self, response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        labels = (endpoint, request.method, str(response.status_code))
+        queries = g.metrics_queries
+        path = request.full_path.rstrip('?')
+
+        query_seconds = sum(seconds for _, seconds in queries)
+        response.headers.add('Server-Timing',
+                             f'db;desc="{len(queries)} queries";dur={query_seconds * 1000:.2f}')
+
+        def finish():
+            duration = time.perf_counter() - start
+            self.requests.observe(labels, duration)
+            self.query_counts.observe((endpoint,), len(queries))
+            for sql, seconds in queries:
+                self.queries.observe((endpoint, statement_kind(sql)), seconds)
+            self.log_if_slow(labels, path, duration, queries)
+
+        if response.is_streamed:
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
+    def wrap_cursor(self, cursor):
+        return TimedCursor(cursor, self.record_query)
+
+    def record_query(self, sql, seconds):
+        if has_request_context():
+            queries = g.get('metrics_queries')
+            if queries is not None:
+                queries.append((sql, seconds))
+
+    # ---- sections ----
+    def observe(self, section, label, seconds):
+        if self.enabled:
+            self.sections.observe((section, label), seconds)
+
+    @contextmanager
+    def timer(self, section, label):
+        """Time a block as section_duration_seconds{section, label}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(section, label, time.perf_counter() - start)
+
+    # ---- reporting ----
+    def log_if_slow(self, labels, path, duration, queries):
+        threshold = self.app.config['SLOW_REQUEST_SECONDS']
+        if threshold is None or duration < threshold:
+            return
+
+        endpoint, method, status = labels
+        query_seconds = sum(seconds for _, seconds in queries)
+        lines = [f'Slow request: {method} {path} -> {status} in {duration * 1000:.1f}ms '
+                 f'({endpoint}; {len(queries)} queries, {query_seconds * 1000:.1f}ms in DB)']
+        slowest = sorted(queries, key=lambda q: q[1], reverse=True)
+        for sql, seconds in slowest[:self.app.config['SLOW_REQUEST_MAX_QUERIES']]:
+            lines.append(f'  {seconds * 1000:8.2f}ms  {" ".join(sql.split())[:200]}')
+        self.app.logger.warning('\n'.join(lines))
+
+    def render(self):
+        """Every metric in the Prometheus text format."""
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+
+        if self.startup:
+            lines.append('# HELP app_startup_seconds Time to import and build the application at startup.')
+            lines.append('# TYPE app_startup_seconds gauge')
+            for phase, seconds in self.startup.items():
+                lines.append(f'app_startup_seconds{{phase="{phase}"}} {seconds}')
+
+        if self.db is not None and self.db._pool is not None:
+            stats = self.db.pool.stats()
+            lines.append('# HELP db_pool_connections Pooled connections by state.')
+            lines.append('# TYPE db_pool_connections gauge')
+            for state in ('idle', 'in_use'):
+                lines.append(f'db_pool_connections{{state="{state}"}} {stats[state]}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for histogram in self.histograms:
+            histogram.clear()
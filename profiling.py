@@ -0,0 +1,189 @@
+# profiling.py
+import hmac
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from flask import g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows: serve.py does not fork there anyway
+    fcntl = None
+
+SAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+class RequestProfiler:
+    """
+    Samples requests with cProfile and aggregates them per endpoint.
+
+    A request is profiled with probability PROFILE_SAMPLE_RATE, or when
+    it carries PROFILE_HEADER set to PROFILE_SECRET. Each endpoint's
+    profiles are merged into one pstats file, <endpoint>.prof, in
+    PROFILE_DIR. Only one request per process is profiled at a time;
+    others are left alone. When neither sampling nor the header is
+    configured, no hooks are installed at all.
+
+    The files on disk are the totals: each profile is merged into them
+    under a file lock, so workers sharing PROFILE_DIR add to one another's
+    profiles instead of overwriting them.
+    """
+    def __init__(self, app=None):
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_HEADER', 'X-Profile')
+        app.config.setdefault('PROFILE_SECRET', None)
+        app.config.setdefault('PROFILE_ADMINS', ())
+        app.config.setdefault('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'student-profiles'))
+
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.header = app.config['PROFILE_HEADER']
+        self.secret = app.config['PROFILE_SECRET']
+        self.directory = app.config['PROFILE_DIR']
+
+        if self.sample_rate or self.secret:
+            app.before_request(self.start)
+            app.after_request(self.stop)
+
+    # ---- hooks ----
+    def wanted(self):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        value = request.headers.get(self.header) if self.secret else None
+        return value is not None and hmac.compare_digest(value, self.secret)
+
+    def start(self):
+        if not self.wanted() or not self._busy.acquire(blocking=False):
+            return
+        # Imported here: most processes never profile a request
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) owns the hook
+            self._busy.release()
+            return
+        g.profile = profile
+
+    def stop(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+
+        def finish():
+            profile.disable()
+            self._busy.release()
+            self.add(endpoint, profile)
+
+        if response.is_streamed:
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
+    # ---- aggregation ----
+    @contextmanager
+    def _locked(self):
+        """Hold the directory lock against other threads and processes."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, '.lock'), 'a') as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                yield
+
+    def add(self, endpoint, profile):
+        """Merge one profile into the endpoint's file on disk."""
+        import pstats
+        name = SAFE_NAME_RE.sub('_', endpoint)
+        path = self.path(name)
+        with self._locked():
+            stats = pstats.Stats(profile)
+            if os.path.exists(path):
+                stats.add(path)
+            samples = self._samples()
+            samples[name] = samples.get(name, 0) + 1
+            self._replace(path, stats.dump_stats)
+            self._replace(self._samples_path(), lambda tmp: self._dump_samples(tmp, samples))
+
+    def _replace(self, path, write):
+        """Write to a temporary file and rename it over path."""
+        tmp = f'{path}.{os.getpid()}.tmp'
+        write(tmp)
+        os.replace(tmp, path)
+
+    def _samples_path(self):
+        return os.path.join(self.directory, 'samples.json')
+
+    def _samples(self):
+        try:
+            with open(self._samples_path()) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _dump_samples(path, samples):
+        with open(path, 'w') as handle:
+            json.dump(samples, handle)
+
+    def path(self, name):
+        return os.path.join(self.directory, f'{name}.prof')
+
+    def list(self):
+        """Aggregated profiles on disk, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        samples = self._samples()
+        profiles = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.prof'):
+                continue
+            name = filename[:-len('.prof')]
+            info = os.stat(os.path.join(self.directory, filename))
+            profiles.append({
+                'endpoint': name,
+                'samples': samples.get(name),
+                'bytes': info.st_size,
+                'modified': info.st_mtime
+            })
+        return sorted(profiles, key=lambda p: p['modified'], reverse=True)
+
+    def find(self, name):
+        """Path of an endpoint's aggregated profile, or None."""
+        path = self.path(SAFE_NAME_RE.sub('_', name))
+        return path if os.path.exists(path) else None
+
+    def report(self, name, sort='cumulative', limit=50):
+        """Human-readable top functions for one endpoint, or None."""
+        path = self.find(name)
+        if path is None:
+            return None
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def reset(self):
+        if not os.path.isdir(self.directory):
+            return
+        with self._locked():
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.prof') or filename == 'samples.json':
+                    try:
+                        os.remove(os.path.join(self.directory, filename))
+                    except OSError:
+                        pass
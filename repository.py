@@ -0,0 +1,599 @@
+# repository.py
+import base64
+import json
+from datetime import datetime
+from json.encoder import encode_basestring_ascii as json_string
+
+import search
+
+# ==================== COLUMNS & QUERIES ====================
+# Every query names its columns, so adding a column to the table never
+# shifts the positions Student.from_row relies on.
+STUDENT_COLUMNS = ('id', 'name', 'course', 'age')
+STUDENT_SELECT = 'SELECT id, name, course, age, version FROM students'
+
+SELECT_STUDENT = STUDENT_SELECT + ' WHERE id = %s'
+SELECT_PAGE = STUDENT_SELECT + ' WHERE id > %s ORDER BY id LIMIT %s'
+SELECT_ALL = STUDENT_SELECT + ' ORDER BY id'
+SELECT_RANGE = STUDENT_SELECT + ' WHERE id BETWEEN %s AND %s ORDER BY id'
+SELECT_ID_BOUNDS = 'SELECT MIN(id), MAX(id) FROM students'
+SELECT_VERSION = 'SELECT version FROM students WHERE id = %s'
+
+INSERT_STUDENT = 'INSERT INTO students (name, course, age) VALUES (%s, %s, %s)'
+UPSERT_STUDENT = (
+    'INSERT INTO students (id, name, course, age) VALUES (%s, %s, %s, %s) '
+    'ON DUPLICATE KEY UPDATE name = VALUES(name), course = VALUES(course), age = VALUES(age), '
+    'version = version + 1, updated_at = CURRENT_TIMESTAMP'
+)
+DELETE_STUDENT = 'DELETE FROM students WHERE id = %s'
+
+# Columns a client may change, in the order they appear in UPDATE statements
+UPDATABLE_COLUMNS = ('name', 'course', 'age')
+
+# Summary counters, maintained by triggers (see setup_database.py)
+SELECT_COURSE_STATS = (
+    'SELECT course, students, age_sum, age_count FROM student_course_stats '
+    'WHERE students > 0 ORDER BY course'
+)
+SELECT_AGE_STATS = 'SELECT age, students FROM student_age_stats WHERE students > 0 ORDER BY age'
+REBUILD_COURSE_STATS = (
+    'INSERT INTO student_course_stats (course, students, age_sum, age_count) '
+    'SELECT course, COUNT(*), COALESCE(SUM(age), 0), COUNT(age) FROM students GROUP BY course'
+)
+REBUILD_AGE_STATS = (
+    'INSERT INTO student_age_stats (age, students) '
+    'SELECT age, COUNT(*) FROM students WHERE age IS NOT NULL GROUP BY age'
+)
+
+# Change log, appended by triggers (see setup_database.py)
+SELECT_CHANGES = (
+    'SELECT c.seq, c.student_id, s.name, s.course, s.age, s.created_at, s.updated_at, '
+    'c.changed_at, CURRENT_TIMESTAMP '
+    'FROM student_changes c LEFT JOIN students s ON s.id = c.student_id '
+    'WHERE c.seq > %s ORDER BY c.seq LIMIT %s'
+)
+# Keep only each student's newest entry; a reader past it has seen the rest
+COMPACT_CHANGES = (
+    'DELETE FROM student_changes WHERE seq NOT IN '
+    '(SELECT seq FROM (SELECT MAX(seq) AS seq FROM student_changes GROUP BY student_id) latest)'
+)
+BACKFILL_CHANGES = (
+    "INSERT INTO student_changes (student_id, operation) "
+    "SELECT id, 'insert' FROM students s "
+    "WHERE NOT EXISTS (SELECT 1 FROM student_changes c WHERE c.student_id = s.id) ORDER BY id"
+)
+
+# Bulk import checkpoints, written in each batch's transaction
+SELECT_CHECKPOINT = 'SELECT position, rows_read, inserted, failed FROM import_checkpoints WHERE name = %s'
+SAVE_CHECKPOINT = (
+    'INSERT INTO import_checkpoints (name, source, position, rows_read, inserted, failed) '
+    'VALUES (%s, %s, %s, %s, %s, %s) '
+    'ON DUPLICATE KEY UPDATE source = VALUES(source), position = VALUES(position), '
+    'rows_read = VALUES(rows_read), inserted = VALUES(inserted), failed = VALUES(failed)'
+)
+DELETE_CHECKPOINT = 'DELETE FROM import_checkpoints WHERE name = %s'
+
+# Background jobs (see jobs.py)
+JOB_COLUMNS = ('id', 'kind', 'params', 'status', 'progress', 'total', 'result', 'error',
+               'created_by', 'created_at', 'started_at', 'finished_at')
+INSERT_JOB = "INSERT INTO jobs (kind, params, status, created_by) VALUES (%s, %s, 'queued', %s)"
+SELECT_JOB = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = %s"
+SELECT_QUEUED_JOBS = "SELECT id FROM jobs WHERE status = 'queued' ORDER BY id"
+CLAIM_JOB = "UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP WHERE id = %s AND status = 'queued'"
+UPDATE_JOB_PROGRESS = 'UPDATE jobs SET progress = %s, total = %s WHERE id = %s'
+SELECT_JOB_CANCEL = 'SELECT cancel_requested FROM jobs WHERE id = %s'
+FINISH_JOB = 'UPDATE jobs SET status = %s, progress = %s, result = %s, error = %s, finished_at = CURRENT_TIMESTAMP WHERE id = %s'
+CANCEL_QUEUED_JOB = "UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP WHERE id = %s AND status = 'queued'"
+REQUEST_JOB_CANCEL = "UPDATE jobs SET cancel_requested = 1 WHERE id = %s AND status = 'running'"
+
+# Periodic tasks shared by every worker (see stats.py); epoch seconds
+ENSURE_SCHEDULE = 'INSERT INTO schedules (name, next_run_at) VALUES (%s, %s) ON DUPLICATE KEY UPDATE name = name'
+CLAIM_SCHEDULE = 'UPDATE schedules SET next_run_at = %s WHERE name = %s AND next_run_at <= %s'
+
+SELECT_USER = 'SELECT id, username, password FROM users WHERE username = %s'
+SELECT_USER_ID = 'SELECT id FROM users WHERE username = %s'
+INSERT_USER = 'INSERT INTO users (username, password) VALUES (%s, %s)'
+UPDATE_USER_PASSWORD = 'UPDATE users SET password = %s WHERE id = %s'
+
+# ==================== RECORDS ====================
+class Student:
+    """
+    One students row. Attribute access works unchanged in templates.
+    version travels in the ETag, not in the JSON/XML representation.
+    """
+    __slots__ = STUDENT_COLUMNS + ('version',)
+
+    def __init__(self, id, name, course, age, version=1):
+        self.id = id
+        self.name = name
+        self.course = course
+        self.age = age
+        self.version = version
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a row whose first columns are STUDENT_COLUMNS + version."""
+        return cls(row[0], row[1], row[2], row[3], row[4])
+
+    def replace(self, changes, version):
+        """A copy with {column: value} changes applied at a new version."""
+        values = dict(self.items())
+        values.update(changes)
+        return Student(version=version, **values)
+
+    @property
+    def etag(self):
+        return f'{self.id}.{self.version}'
+
+    def items(self):
+        return zip(STUDENT_COLUMNS, (self.id, self.name, self.course, self.age))
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'course': self.course, 'age': self.age}
+
+    def to_row(self):
+        """(id, name, course, age), as STUDENT_COLUMNS."""
+        return (self.id, self.name, self.course, self.age)
+
+    def to_json(self):
+        return row_to_json(self.to_row())
+
+    def __repr__(self):
+        return (f'Student(id={self.id!r}, name={self.name!r}, course={self.course!r}, '
+                f'age={self.age!r}, version={self.version!r})')
+
+def row_to_json(row):
+    """
+    Compact JSON for an (id, name, course, age) row, written straight from
+    the tuple. Keys are sorted like Flask's jsonify output.
+    """
+    student_id, name, course, age = row[0], row[1], row[2], row[3]
+    age = 'null' if age is None else age
+    return f'{{"age":{age},"course":{json_string(course)},"id":{student_id},"name":{json_string(name)}}}'
+
+# ==================== STUDENTS ====================
+def get_student(cursor, student_id):
+    cursor.execute(SELECT_STUDENT, (student_id,))
+    row = cursor.fetchone()
+    return Student.from_row(row) if row else None
+
+def get_students(cursor, student_ids, chunk_size=500):
+    """
+    {id: Student} for the given ids, with one IN (...) query per
+    chunk_size ids. Missing ids are simply absent.
+    """
+    students = {}
+    ids = list(student_ids)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f'{STUDENT_SELECT} WHERE id IN ({placeholders})', chunk)
+        for row in cursor.fetchall():
+            students[row[0]] = Student.from_row(row)
+    return students
+
+def list_page(cursor, after, limit):
+    """
+    One keyset page ordered by id. Returns (students, next_cursor), where
+    next_cursor is None on the last page.
+    """
+    # Fetch one extra row to know whether another page exists
+    cursor.execute(SELECT_PAGE, (after, limit + 1))
+    rows = cursor.fetchall()
+    students = [Student.from_row(row) for row in rows[:limit]]
+    next_cursor = students[-1].id if len(rows) > limit else None
+    return students, next_cursor
+
+class StudentQuery:
+    """
+    A filtered, sorted, projected listing compiled into one parameterized
+    statement. Filters: course IN (...), age_min <= age <= age_max. Sort
+    is one of STUDENT_COLUMNS, ties broken by id, so keyset paging works
+    on any sort: `after` is the (sort value, id) of the previous page's
+    last row. With limit=None the query returns every match (export).
+
+    Composite indexes (course, age), (course, name) and (age) in
+    setup_database.py cover the filter + sort combinations.
+    """
+    def __init__(self, courses=(), age_min=None, age_max=None, sort='id', descending=False,
+                 fields=STUDENT_COLUMNS, after=None, limit=None):
+        self.courses = tuple(courses)
+        self.age_min = age_min
+        self.age_max = age_max
+        self.sort = sort
+        self.descending = descending
+        # id is always selected: it is the tie-breaker and the cursor
+        self.fields = ('id',) + tuple(f for f in STUDENT_COLUMNS if f in fields and f != 'id')
+        self.after = after
+        self.limit = limit
+
+    @property
+    def is_default(self):
+        """Unfiltered, id-ordered, all columns: the plain listing."""
+        return (not self.courses and self.age_min is None and self.age_max is None
+                and self.sort == 'id' and not self.descending and self.fields == STUDENT_COLUMNS)
+
+    def cache_key(self):
+        return (','.join(self.courses), self.age_min, self.age_max, self.sort,
+                'desc' if self.descending else 'asc', ','.join(self.fields), self.encode_cursor(self.after), self.limit)
+
+    def _where(self):
+        clauses, params = [], []
+        if self.courses:
+            clauses.append(f"course IN ({', '.join(['%s'] * len(self.courses))})")
+            params.extend(self.courses)
+        if self.age_min is not None:
+            clauses.append('age >= %s')
+            params.append(self.age_min)
+        if self.age_max is not None:
+            clauses.append('age <= %s')
+            params.append(self.age_max)
+        if self.after is not None:
+            clause, after_params = self._after_clause()
+            clauses.append(clause)
+            params.extend(after_params)
+        return clauses, params
+
+    def _after_clause(self):
+        value, last_id = self.after
+        op = '<' if self.descending else '>'
+        if self.sort == 'id':
+            return f'id {op} %s', [last_id]
+        column = self.sort
+        # NULLs sort first ascending and last descending (MySQL and SQLite)
+        if value is None:
+            if self.descending:
+                return f'({column} IS NULL AND id < %s)', [last_id]
+            return f'(({column} IS NULL AND id > %s) OR {column} IS NOT NULL)', [last_id]
+        clause = f'({column} {op} %s OR ({column} = %s AND id {op} %s)'
+        clause += f' OR {column} IS NULL)' if self.descending else ')'
+        return clause, [value, value, last_id]
+
+    def sql(self):
+        """(statement, params); fetches limit + 1 rows to detect a next page."""
+        clauses, params = self._where()
+        direction = ' DESC' if self.descending else ''
+        sql = f"SELECT {', '.join(self.fields)} FROM students"
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if self.sort == 'id':
+            sql += f' ORDER BY id{direction}'
+        else:
+            sql += f' ORDER BY {self.sort}{direction}, id{direction}'
+        if self.limit is not None:
+            sql += ' LIMIT %s'
+            params.append(self.limit + 1)
+        return sql, params
+
+    def row_to_dict(self, row):
+        return dict(zip(self.fields, row))
+
+    def cursor_for(self, record):
+        """The `after` value that continues after this record (a dict)."""
+        return (record.get(self.sort) if self.sort != 'id' else record['id'], record['id'])
+
+    def encode_cursor(self, after):
+        """id sorts keep plain integer cursors; others get an opaque token."""
+        if after is None:
+            return None
+        if self.sort == 'id':
+            return after[1]
+        return base64.urlsafe_b64encode(json.dumps(list(after)).encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, token):
+        """Inverse of encode_cursor; raises ValueError."""
+        if self.sort == 'id':
+            return (None, int(token))
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if not isinstance(last_id, int):
+            raise ValueError('Invalid cursor')
+        return (value, last_id)
+
+def list_filtered(cursor, query):
+    """
+    Run a StudentQuery. With a limit returns (records, next_after), with
+    next_after None on the last page; without one, executes and returns
+    the cursor for streaming.
+    """
+    sql, params = query.sql()
+    cursor.execute(sql, params)
+    if query.limit is None:
+        return cursor
+    rows = cursor.fetchall()
+    records = [query.row_to_dict(row) for row in rows[:query.limit]]
+    next_after = query.cursor_for(records[-1]) if len(rows) > query.limit else None
+    return records, next_after
+
+def explain(cursor, sql, params, standin=False):
+    """The database's plan for a statement, as a list of dicts."""
+    cursor.execute(('EXPLAIN QUERY PLAN ' if standin else 'EXPLAIN ') + sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def list_all(cursor):
+    """Execute the full-table select in id order; read rows from the cursor."""
+    cursor.execute(SELECT_ALL)
+    return cursor
+
+def list_range(cursor, low, high):
+    """Execute a select of ids low..high in id order; read rows from the cursor."""
+    cursor.execute(SELECT_RANGE, (low, high))
+    return cursor
+
+def id_bounds(cursor):
+    """(lowest id, highest id), or (None, None) for an empty table."""
+    cursor.execute(SELECT_ID_BOUNDS)
+    return cursor.fetchone()
+
+def search_students(cursor, query, limit):
+    return [Student.from_row(row) for row in search.search_students(cursor, query, limit)]
+
+def insert_student(cursor, values):
+    """Insert (name, course, age); returns the new id."""
+    cursor.execute(INSERT_STUDENT, values)
+    return cursor.lastrowid
+
+def insert_students(cursor, rows):
+    """Multi-row insert of (name, course, age) tuples."""
+    cursor.executemany(INSERT_STUDENT, rows)
+
+def upsert_students(cursor, rows):
+    """Insert or replace (id, name, course, age) tuples."""
+    cursor.executemany(UPSERT_STUDENT, rows)
+
+def version_clause(expected_versions):
+    """SQL and params restricting a statement to the given row versions."""
+    if not expected_versions:
+        return '', []
+    placeholders = ', '.join(['%s'] * len(expected_versions))
+    return f' AND version IN ({placeholders})', list(expected_versions)
+
+def update_student(cursor, student_id, changes, expected_versions=None):
+    """
+    Apply a {column: value} dict in one conditional UPDATE that also bumps
+    the version. LAST_INSERT_ID(expr) hands the new version back through
+    lastrowid, so no re-read is needed. Returns the new version, or None
+    when no row matched (missing, or not at an expected version).
+    """
+    columns = [column for column in UPDATABLE_COLUMNS if column in changes]
+    assignments = ', '.join(f'{column} = %s' for column in columns)
+    condition, condition_params = version_clause(expected_versions)
+    cursor.execute(
+        f'UPDATE students SET {assignments}, version = LAST_INSERT_ID(version + 1), '
+        f'updated_at = CURRENT_TIMESTAMP '
+        f'WHERE id = %s{condition}',
+        [changes[column] for column in columns] + [student_id] + condition_params
+    )
+    return cursor.lastrowid if cursor.rowcount else None
+
+def delete_student(cursor, student_id, expected_versions=None):
+    """Conditional DELETE; returns the number of deleted rows."""
+    condition, condition_params = version_clause(expected_versions)
+    cursor.execute(DELETE_STUDENT + condition, [student_id] + condition_params)
+    return cursor.rowcount
+
+def delete_students(cursor, student_ids):
+    """Unconditional DELETE of the given ids; returns the number deleted."""
+    placeholders = ', '.join(['%s'] * len(student_ids))
+    cursor.execute(f'DELETE FROM students WHERE id IN ({placeholders})', list(student_ids))
+    return cursor.rowcount
+
+def get_version(cursor, student_id):
+    """Current version, or None if the student does not exist."""
+    cursor.execute(SELECT_VERSION, (student_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+# ==================== STATISTICS ====================
+def read_stats(cursor):
+    """Raw counters: ([(course, students, age_sum, age_count)], [(age, students)])."""
+    cursor.execute(SELECT_COURSE_STATS)
+    courses = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute(SELECT_AGE_STATS)
+    ages = [tuple(row) for row in cursor.fetchall()]
+    return courses, ages
+
+def student_stats(cursor):
+    """Totals, counts by course and the age distribution, from the counters."""
+    courses, ages = read_stats(cursor)
+    age_sum = sum(row[2] for row in courses)
+    age_count = sum(row[3] for row in courses)
+    return {
+        'total': sum(row[1] for row in courses),
+        'courses': len(courses),
+        'by_course': [
+            {'course': course, 'count': students,
+             'average_age': round(course_age_sum / course_age_count, 2) if course_age_count else None}
+            for course, students, course_age_sum, course_age_count in courses
+        ],
+        'age': {
+            'min': ages[0][0] if ages else None,
+            'max': ages[-1][0] if ages else None,
+            'average': round(age_sum / age_count, 2) if age_count else None,
+            'distribution': [{'age': age, 'count': students} for age, students in ages]
+        }
+    }
+
+def reconcile_stats(cursor):
+    """
+    Rebuild the counters from the students table. Run inside one
+    transaction so readers never see them half rebuilt. Returns the
+    number of counter rows that had drifted.
+    """
+    before = read_stats(cursor)
+    cursor.execute('DELETE FROM student_course_stats')
+    cursor.execute('DELETE FROM student_age_stats')
+    cursor.execute(REBUILD_COURSE_STATS)
+    cursor.execute(REBUILD_AGE_STATS)
+    after = read_stats(cursor)
+    
+    drifted = 0
+    for old_rows, new_rows in zip(before, after):
+        old = {row[0]: row[1:] for row in old_rows}
+        new = {row[0]: row[1:] for row in new_rows}
+        drifted += sum(1 for key in old.keys() | new.keys() if old.get(key) != new.get(key))
+    return drifted
+
+# ==================== CHANGES ====================
+def timestamp(value):
+    """ISO 8601 text for a DATETIME (MySQL) or its string form (stand-in)."""
+    if value is None or isinstance(value, str):
+        return value.replace(' ', 'T') if value else value
+    return value.isoformat()
+
+def list_changes(cursor, since, limit, settle_seconds=0):
+    """
+    Changes after sequence number `since`, oldest first. Each student
+    appears once per page with its current state: an upsert carrying the
+    row, or a delete tombstone when the row no longer exists. Returns
+    (changes, next_cursor, has_more); next_cursor is the last sequence
+    number read, so it only ever moves forward.
+
+    Sequence numbers are assigned when a write happens, not when it
+    commits, so a missing number may belong to a transaction that has
+    yet to commit. The page stops before the first gap written less than
+    settle_seconds ago, and a later call picks up from there. Older gaps
+    are rollbacks or compacted entries and are skipped.
+    """
+    cursor.execute(SELECT_CHANGES, (since, limit + 1))
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    expected = since + 1
+    for index, row in enumerate(rows):
+        seq, changed_at, now = row[0], row[7], row[8]
+        if seq != expected and seconds_between(changed_at, now) < settle_seconds:
+            rows, has_more = rows[:index], False
+            break
+        expected = seq + 1
+
+    latest = {}
+    for seq, student_id, name, course, age, created_at, updated_at, _, _ in rows:
+        latest.pop(student_id, None)
+        if name is None:
+            latest[student_id] = {'seq': seq, 'operation': 'delete', 'id': student_id}
+        else:
+            latest[student_id] = {
+                'seq': seq,
+                'operation': 'upsert',
+                'student': {'id': student_id, 'name': name, 'course': course, 'age': age,
+                            'created_at': timestamp(created_at), 'updated_at': timestamp(updated_at)}
+            }
+
+    next_cursor = rows[-1][0] if rows else since
+    return list(latest.values()), next_cursor, has_more
+
+def seconds_between(earlier, later):
+    """Seconds between two DATETIMEs (MySQL) or their string forms (stand-in)."""
+    if isinstance(earlier, str):
+        earlier, later = datetime.fromisoformat(earlier), datetime.fromisoformat(later)
+    return (later - earlier).total_seconds()
+
+def compact_changes(cursor):
+    """Drop change entries superseded by a newer one for the same student."""
+    cursor.execute(COMPACT_CHANGES)
+    return cursor.rowcount
+
+def backfill_changes(cursor):
+    """Log an insert for every student that has no change entry yet."""
+    cursor.execute(BACKFILL_CHANGES)
+    return cursor.rowcount
+
+# ==================== IMPORT CHECKPOINTS ====================
+def get_checkpoint(cursor, name):
+    """(position, rows_read, inserted, failed) of a named import, or None."""
+    cursor.execute(SELECT_CHECKPOINT, (name,))
+    return cursor.fetchone()
+
+def save_checkpoint(cursor, name, source, position, rows_read, inserted, failed):
+    cursor.execute(SAVE_CHECKPOINT, (name, source, position, rows_read, inserted, failed))
+
+def delete_checkpoint(cursor, name):
+    cursor.execute(DELETE_CHECKPOINT, (name,))
+
+# ==================== JOBS ====================
+def insert_job(cursor, kind, params, created_by):
+    cursor.execute(INSERT_JOB, (kind, json.dumps(params), created_by))
+    return cursor.lastrowid
+
+def get_job(cursor, job_id):
+    """A job as a dict (params and result decoded), or None."""
+    cursor.execute(SELECT_JOB, (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    for column in ('params', 'result'):
+        job[column] = json.loads(job[column]) if job[column] else None
+    for column in ('created_at', 'started_at', 'finished_at'):
+        job[column] = timestamp(job[column])
+    return job
+
+def queued_job_ids(cursor):
+    cursor.execute(SELECT_QUEUED_JOBS)
+    return [row[0] for row in cursor.fetchall()]
+
+def claim_job(cursor, job_id):
+    """Move a queued job to running; False if someone else got it first."""
+    cursor.execute(CLAIM_JOB, (job_id,))
+    return cursor.rowcount == 1
+
+def update_job_progress(cursor, job_id, progress, total):
+    """Record progress; returns whether cancellation was requested."""
+    cursor.execute(UPDATE_JOB_PROGRESS, (progress, total, job_id))
+    cursor.execute(SELECT_JOB_CANCEL, (job_id,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+def finish_job(cursor, job_id, status, progress, result=None, error=None):
+    cursor.execute(FINISH_JOB, (status, progress, json.dumps(result) if result is not None else None,
+                                error, job_id))
+
+def cancel_job(cursor, job_id):
+    """
+    Cancel a queued job outright, or flag a running one for its worker.
+    Returns 'cancelled', 'cancelling', or None if the job had finished.
+    """
+    cursor.execute(CANCEL_QUEUED_JOB, (job_id,))
+    if cursor.rowcount:
+        return 'cancelled'
+    cursor.execute(REQUEST_JOB_CANCEL, (job_id,))
+    return 'cancelling' if cursor.rowcount else None
+
+def analyze_students(cursor, standin=False):
+    """Refresh the optimizer's index statistics for students."""
+    cursor.execute('ANALYZE students' if standin else 'ANALYZE TABLE students')
+    if cursor.description:
+        cursor.fetchall()
+
+# ==================== SCHEDULES ====================
+def claim_schedule(cursor, name, now, interval):
+    """
+    Take the run of a periodic task that is due at `now` and move the
+    next one `interval` seconds on. Only one caller gets True per due
+    run, however many workers ask; a task seen for the first time is
+    first due one interval from now.
+    """
+    cursor.execute(ENSURE_SCHEDULE, (name, now + interval))
+    cursor.execute(CLAIM_SCHEDULE, (now + interval, name, now))
+    return cursor.rowcount == 1
+
+# ==================== USERS ====================
+def get_user(cursor, username):
+    """(id, username, password_hash) or None."""
+    cursor.execute(SELECT_USER, (username,))
+    return cursor.fetchone()
+
+def username_exists(cursor, username):
+    cursor.execute(SELECT_USER_ID, (username,))
+    return cursor.fetchone() is not None
+
+def insert_user(cursor, username, password_hash):
+    cursor.execute(INSERT_USER, (username, password_hash))
+
+def update_user_password(cursor, user_id, password_hash):
+    cursor.execute(UPDATE_USER_PASSWORD, (password_hash, user_id))
@@ -1,124 +1,292 @@
 # routes.py
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
-from flask_mysqldb import MySQL
+from flask import Blueprint, current_app, render_template, stream_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, send_file
 import jwt
 from functools import wraps
-from datetime import datetime, timedelta
-import bcrypt
+from datetime import timedelta
 
-from app import app, mysql
+from app import db, cache, hasher, tokens, metrics, profiler, reconciler, events, compressor, jobs
+from auth import Overloaded, TokenRevoked
+from events import TooManySubscribers
+from jobs import QueueFull
+from utils import iter_rows, validate_student, validate_student_changes, chunked
+import csv
+import json
+import os
+import repository
+import serializers
+from werkzeug.http import parse_etags
+from cache import make_etag
+
+# Registered on the application by app.create_app
+bp = Blueprint('students', __name__)
 
 # ==================== HELPER FUNCTIONS ====================
-def hash_password(password):
-    """Hash a password for storing."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def too_many_requests(retry_after):
+    """429 with Retry-After; JSON for the API, plain text for pages."""
+    headers = {'Retry-After': str(retry_after)}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Too many requests'}), 429, headers
+    return f'Too many requests, please retry in {retry_after} seconds', 429, headers
+
+def auth_throttled(f):
+    """Per-client token bucket in front of endpoints that run bcrypt."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method == 'POST':
+            try:
+                hasher.throttle(request.remote_addr)
+            except Overloaded as e:
+                return too_many_requests(e.retry_after)
+        return f(*args, **kwargs)
+    
+    return decorated
+
+def upgrade_password_hash(user_id, hashed_password, password):
+    """Rehash with the current work factor after a successful login."""
+    if hasher.needs_rehash(hashed_password):
+        repository.update_user_password(db.cursor(), user_id, hasher.hash(password))
+        db.connection.commit()
 
-def check_password(hashed_password, user_password):
-    """Verify a stored password against one provided by user"""
-    return bcrypt.checkpw(user_password.encode('utf-8'), hashed_password.encode('utf-8'))
+def load_student(student_id):
+    """
+    Read one student through the cache. Returns a CacheEntry holding a
+    Student, tagged with its id and row version, or None.
+    """
+    def load():
+        return repository.get_student(db.cursor(read_only=True, cacheable=True), student_id)
+    
+    return cache.get_or_load(cache.student_key(student_id), load, etag=lambda student: student.etag)
+
+def if_match_versions(student_id, etags=None):
+    """
+    Row versions named by If-Match (or the given parsed ETags) for this
+    student. None means the request is unconditional (no header, or
+    '*'); an empty list means no tag can match, which is answered with
+    412 without touching MySQL. Tags look like "<id>.<version>-<format>",
+    as served by GET.
+    """
+    etags = request.if_match if etags is None else etags
+    if not etags or etags.star_tag:
+        return None
+    
+    versions = []
+    # Compressed responses carry the same tag made weak; the version is what counts
+    for tag in etags.as_set(include_weak=True):
+        tagged_id, _, version = tag.split('-', 1)[0].partition('.')
+        if tagged_id == str(student_id) and version.isdigit():
+            versions.append(int(version))
+    return versions
+
+def precondition_failed(cursor, student_id):
+    """After a conditional write matched nothing: 404 if gone, else 412."""
+    if repository.get_version(cursor, student_id) is None:
+        return 404, 'Student not found'
+    return 412, 'Student was modified; fetch it again and retry'
+
+# Writes are split into the statement(s), run inside the caller's
+# transaction, and the cache/event side effects, run after commit. The
+# single-student routes and /api/batch share both halves.
+def write_create(cursor, values):
+    """Insert; returns the new Student."""
+    student_id = repository.insert_student(cursor, values)
+    return repository.Student(student_id, *values)
+
+def write_update(cursor, student_id, changes, expected=None):
+    """
+    One conditional UPDATE. Returns (student, None) with the new
+    representation, or (None, (status, message)).
+    """
+    version = repository.update_student(cursor, student_id, changes, expected)
+    if version is None:
+        return None, precondition_failed(cursor, student_id)
+    
+    # Build the new representation from what we already know when we can
+    cached = cache.peek(cache.student_key(student_id))
+    if all(column in changes for column in repository.UPDATABLE_COLUMNS):
+        student = repository.Student(student_id, version=version, **changes)
+    elif cached is not None and cached.data.version == version - 1:
+        student = cached.data.replace(changes, version)
+    else:
+        student = repository.get_student(cursor, student_id)
+    return student, None
+
+def write_delete(cursor, student_id, expected=None):
+    """Conditional DELETE. Returns None, or (status, message)."""
+    if not repository.delete_student(cursor, student_id, expected):
+        return precondition_failed(cursor, student_id)
+    return None
+
+def created(student):
+    cache.invalidate_lists()
+    events.publish('created', student.to_dict())
+
+def updated(student):
+    cache.put(cache.student_key(student.id), student, student.etag)
+    cache.invalidate_lists()
+    events.publish('updated', student.to_dict())
+
+def deleted(student_id):
+    cache.invalidate_student(student_id)
+    events.publish('deleted', {'id': student_id})
+
+def conditional_response(validator, format_type, build, headers=None):
+    """
+    Answer If-None-Match with 304 before anything is serialized; reuse
+    a stored compressed body for this ETag; otherwise call build() and
+    tag the response with the ETag, "<validator>-<format>".
+    """
+    etag = f'{validator}-{format_type}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers=headers)
+    elif (response := compressor.cached_response(etag)) is not None:
+        if headers:
+            response.headers.extend(headers)
+    else:
+        with metrics.timer('serialize', format_type):
+            response = build()
+        if headers:
+            response.headers.extend(headers)
+    response.set_etag(etag)
+    response.vary.add('Accept')
+    return response
+
+def negotiate(tabular=True):
+    """
+    The serializer for this request: Accept if it names a format we
+    offer, else ?format=, else JSON. None if ?format= names something
+    this route does not offer. Tabular formats (CSV, NDJSON) are only
+    offered by routes that return a list of records.
+    """
+    return serializers.negotiate(request.accept_mimetypes, request.args.get('format'), tabular)
+
+def not_acceptable(tabular=True):
+    return jsonify({'error': f"format must be one of {', '.join(serializers.available(tabular))}"}), 406
+
+def document_response(serializer, data, status=200):
+    """One document in the negotiated format, buffered (it is small)."""
+    response = Response(list(serializer.document(data)), status=status, mimetype=serializer.mimetype)
+    response.vary.add('Accept')
+    return response
+
+def rows_response(serializer, columns, rows, stream=False):
+    """Row tuples in the negotiated format; stream=True keeps the request context for a cursor."""
+    body = serializer.rows(columns, rows)
+    response = Response(stream_with_context(body) if stream else list(body), mimetype=serializer.mimetype)
+    response.vary.add('Accept')
+    return response
+
+def record_rows(records, columns):
+    """Row tuples from record dicts."""
+    return (tuple(record[column] for column in columns) for record in records)
 
 # ==================== WEB PAGES ====================
-@app.route('/')
+@bp.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/students')
+@bp.route('/students')
 def students_page():
-    """Students list page with search"""
-    search_query = request.args.get('q', '')
-    
+    """
+    Students list page with search, one page at a time. Browsing pages
+    by id (?after=<last id>); search results page by position within the
+    first SEARCH_LIMIT_MAX matches. There is no total count: a page reads
+    one extra row to know whether a next page exists. The rendered rows
+    are cached per page and search, and every write invalidates them.
+    The page is streamed, so the header is sent before the query runs.
+    """
+    search_query = request.args.get('q', '').strip()
     try:
-        cursor = mysql.connection.cursor()
-        
+        limit = int(request.args.get('limit', current_app.config['STUDENTS_PAGE_SIZE']))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        limit, after = current_app.config['STUDENTS_PAGE_SIZE'], 0
+    limit = min(max(limit, 1), current_app.config['STUDENTS_PAGE_SIZE_MAX'])
+    after = max(after, 0)
+    
+    def render_rows():
+        cursor = db.cursor(read_only=True, cacheable=True)
         if search_query:
-            cursor.execute(
-                "SELECT * FROM students WHERE name LIKE %s OR course LIKE %s",
-                (f'%{search_query}%', f'%{search_query}%')
-            )
+            end = after + limit
+            results = repository.search_students(cursor, search_query, min(end + 1, current_app.config['SEARCH_LIMIT_MAX']))
+            students = results[after:end]
+            next_after = end if len(results) > end else None
         else:
-            cursor.execute("SELECT * FROM students")
-        
-        students = cursor.fetchall()
-        
-        student_list = []
-        for student in students:
-            student_list.append({
-                'id': student[0],
-                'name': student[1],
-                'course': student[2],
-                'age': student[3]
-            })
-        
-        return render_template('students.html', 
-                              students=student_list, 
-                              search_query=search_query)
-    except Exception as e:
-        return render_template('error.html', error=str(e))
+            students, next_after = repository.list_page(cursor, after, limit)
+        return {
+            'rows': render_template('_student_rows.html', students=students),
+            'count': len(students),
+            'next_after': next_after
+        }
+    
+    def load_page():
+        try:
+            key = cache.list_key('html', limit, after, search_query)
+            return cache.get_or_load(key, render_rows).data
+        except Exception as e:
+            return {'error': str(e)}
+    
+    return Response(stream_template('students.html',
+                                    load_page=load_page,
+                                    search_query=search_query,
+                                    limit=limit,
+                                    after=after),
+                    mimetype='text/html')
 
-@app.route('/students/create')
+@bp.route('/students/create')
 def create_page():
     return render_template('create.html')
 
-@app.route('/students/<int:student_id>/edit')
+@bp.route('/students/<int:student_id>/edit')
 def edit_student_page(student_id):
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM students WHERE id = %s", (student_id,))
-        student = cursor.fetchone()
+        entry = load_student(student_id)
         
-        if not student:
+        if not entry:
             return "Student not found", 404
         
-        student_data = {
-            'id': student[0],
-            'name': student[1],
-            'course': student[2],
-            'age': student[3]
-        }
-        
-        return render_template('update.html', student=student_data)
+        return render_template('update.html', student=entry.data)
     except Exception as e:
         return str(e), 500
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
+@auth_throttled
 def login_page():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         
         try:
-            cursor = mysql.connection.cursor()
-            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-            user = cursor.fetchone()
+            user = repository.get_user(db.cursor(), username)
             
             if user:
-                # Check password (without email column)
-                hashed_password = user[2]  # Index 2 is password column
-                if bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8')):
-                    # Generate JWT token
-                    token = jwt.encode({
-                        'user_id': user[0],  # id
-                        'username': user[1],  # username
-                        'exp': datetime.utcnow() + timedelta(hours=24)
-                    }, app.config['SECRET_KEY'])
+                # Check password
+                user_id, _, hashed_password = user
+                if hasher.verify(hashed_password, password):
+                    upgrade_password_hash(user_id, hashed_password, password)
+                    
+                    # Generate JWT token (same claims as the API login)
+                    token = tokens.issue(user_id, username, timedelta(hours=24))
                     
                     # Store token in session
                     session['jwt_token'] = token
                     session['username'] = username
                     
                     flash('Login successful!', 'success')
-                    return redirect(url_for('home'))
+                    return redirect(url_for('.home'))
                 else:
                     flash('Invalid password', 'danger')
             else:
                 flash('User not found', 'danger')
                 
+        except Overloaded as e:
+            return too_many_requests(e.retry_after)
         except Exception as e:
             flash('Login error: ' + str(e), 'danger')
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
+@auth_throttled
 def register_page():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -139,62 +307,66 @@ def register_page():
             return render_template('register.html')
         
         try:
-            cursor = mysql.connection.cursor()
+            cursor = db.cursor()
             
             # Check if username exists
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if cursor.fetchone():
+            if repository.username_exists(cursor, username):
                 flash('Username already exists', 'danger')
                 return render_template('register.html')
             
             # Hash password and insert user WITHOUT email
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            cursor.execute(
-                "INSERT INTO users (username, password) VALUES (%s, %s)",
-                (username, hashed_password)
-            )
-            mysql.connection.commit()
+            hashed_password = hasher.hash(password)
+            repository.insert_user(cursor, username, hashed_password)
+            db.connection.commit()
             
             flash('Registration successful! Please login.', 'success')
-            return redirect(url_for('login_page'))
+            return redirect(url_for('.login_page'))
             
+        except Overloaded as e:
+            return too_many_requests(e.retry_after)
         except Exception as e:
             flash('Registration error: ' + str(e), 'danger')
     
     return render_template('register.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
+    if 'jwt_token' in session:
+        tokens.revoke(session['jwt_token'])
     session.clear()
     flash('You have been logged out', 'info')
-    return redirect(url_for('home'))
+    return redirect(url_for('.home'))
 
 # ==================== REST OF YOUR API ROUTES ====================
 # Keep your existing API routes below...
 # JWT decorator, login API, CRUD operations, etc.
 
 # ==================== JWT Authentication Decorator ====================
+def bearer_token():
+    """The token from the Authorization header, with or without 'Bearer'."""
+    auth_header = request.headers.get('Authorization', '')
+    if 'Bearer' in auth_header:
+        parts = auth_header.split()
+        return parts[1] if len(parts) > 1 else None
+    return auth_header or None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if 'Bearer' in auth_header:
-                token = auth_header.split()[1]
-            else:
-                token = auth_header
+        token = bearer_token()
         
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
         
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = data['user']
+            data = tokens.verify(token)
+            # 'user' is the claim used by tokens issued before user_id/username
+            current_user = data.get('username') or data['user']
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
+        except TokenRevoked:
+            return jsonify({'error': 'Token has been revoked'}), 401
+        except (jwt.InvalidTokenError, KeyError):
             return jsonify({'error': 'Invalid token'}), 401
         
         return f(current_user, *args, **kwargs)
@@ -202,7 +374,8 @@ def token_required(f):
     return decorated
 
 # ==================== API AUTH ENDPOINT ====================
-@app.route('/api/login', methods=['POST'])
+@bp.route('/api/login', methods=['POST'])
+@auth_throttled
 def api_login():
     """Generate JWT token for API access"""
     auth = request.authorization
@@ -211,223 +384,625 @@ def api_login():
         return jsonify({'error': 'Login required'}), 401
     
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = %s", (auth.username,))
-        user = cursor.fetchone()
+        user = repository.get_user(db.cursor(), auth.username)
         
         if user:
             # Check password
-            hashed_password = user[2]  # password column
-            if bcrypt.checkpw(auth.password.encode('utf-8'), hashed_password.encode('utf-8')):
-                token = jwt.encode({
-                    'user': auth.username,
-                    'exp': datetime.utcnow() + timedelta(hours=1)
-                }, app.config['SECRET_KEY'])
+            user_id, username, hashed_password = user
+            if hasher.verify(hashed_password, auth.password):
+                upgrade_password_hash(user_id, hashed_password, auth.password)
+                
+                token = tokens.issue(user_id, username, timedelta(hours=1))
                 
                 return jsonify({'token': token}), 200
     
+    except Overloaded as e:
+        return too_many_requests(e.retry_after)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
     return jsonify({'error': 'Invalid credentials'}), 401
 
+@bp.route('/api/logout', methods=['POST'])
+@token_required
+def api_logout(current_user):
+    """Revoke the token used for this request"""
+    tokens.revoke(bearer_token())
+    return jsonify({'message': 'Token revoked'}), 200
+
 # ==================== API CRUD ENDPOINTS ====================
-@app.route('/api/students', methods=['POST'])
+@bp.route('/api/students', methods=['POST'])
 def create_student():
     data = request.get_json()
     
-    # Validation
-    if not data.get('name') or not data['name'].strip():
-        return jsonify({'error': 'Name is required and cannot be empty'}), 400
+    # Validation (shared with the bulk endpoint)
+    values, error = validate_student(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    if not data.get('course') or not data['course'].strip():
-        return jsonify({'error': 'Course is required'}), 400
+    # Insert into database
+    student = write_create(db.cursor(), values)
+    db.connection.commit()
+    created(student)
+    
+    return jsonify({'message': 'Student created', 'id': student.id}), 201
+
+# Bulk create / upsert
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def iter_bulk_records():
+    """
+    Yield (row, record) pairs from a JSON array body or an NDJSON stream.
+    NDJSON is read line by line, so large syncs never sit in memory whole.
+    A line that is not valid JSON is yielded as an Exception.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        row = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield row, json.loads(line)
+            except ValueError as e:
+                yield row, e
+            row += 1
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError('Body must be a JSON array or NDJSON')
+        yield from enumerate(data)
+
+@bp.route('/api/students/bulk', methods=['POST'])
+@token_required
+def bulk_create_students(current_user):
+    """
+    Validate a batch of students and write the valid ones with multi-row
+    inserts, chunk_size rows per statement, in a single transaction.
+    With ?mode=upsert, records carrying an id replace that student.
+    """
+    mode = request.args.get('mode', 'insert')
+    if mode not in ('insert', 'upsert'):
+        return jsonify({'error': 'mode must be insert or upsert'}), 400
     
-    # Age validation
     try:
-        age = int(data.get('age', 0))
-        if not 16 <= age <= 60:
-            return jsonify({'error': 'Age must be between 16 and 60'}), 400
-    except (ValueError, TypeError):
-        return jsonify({'error': 'Age must be a valid integer'}), 400
+        chunk_size = int(request.args.get('chunk_size', current_app.config['BULK_CHUNK_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+    if not 1 <= chunk_size <= current_app.config['BULK_CHUNK_SIZE_MAX']:
+        return jsonify({'error': f"chunk_size must be between 1 and {current_app.config['BULK_CHUNK_SIZE_MAX']}"}), 400
     
-    # Insert into database
-    cursor = mysql.connection.cursor()
-    cursor.execute("INSERT INTO students (name, course, age) VALUES (%s, %s, %s)",
-                   (data['name'].strip(), data['course'].strip(), age))
-    mysql.connection.commit()
+    inserted = 0
+    upserted_ids = []
+    errors = []
     
-    return jsonify({'message': 'Student created', 'id': cursor.lastrowid}), 201
-
-# ... rest of your API routes ...
+    try:
+        cursor = db.cursor()
+        
+        for chunk in chunked(iter_bulk_records(), chunk_size):
+            inserts = []
+            upserts = []
+            
+            for row, record in chunk:
+                if isinstance(record, Exception):
+                    errors.append({'row': row, 'error': f'Invalid JSON: {record}'})
+                    continue
+                
+                values, error = validate_student(record)
+                if error:
+                    errors.append({'row': row, 'error': error})
+                    continue
+                
+                if mode == 'upsert' and record.get('id') is not None:
+                    if not isinstance(record['id'], int) or record['id'] < 1:
+                        errors.append({'row': row, 'error': 'id must be a positive integer'})
+                        continue
+                    upserts.append((record['id'],) + values)
+                else:
+                    inserts.append(values)
+            
+            if inserts:
+                repository.insert_students(cursor, inserts)
+                inserted += len(inserts)
+            
+            if upserts:
+                repository.upsert_students(cursor, upserts)
+                upserted_ids.extend(values[0] for values in upserts)
+        
+        db.connection.commit()
+        
+    except ValueError as e:
+        db.connection.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.connection.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    cache.invalidate_students(upserted_ids)
+    
+    written = inserted + len(upserted_ids)
+    if written:
+        events.publish('bulk', {'inserted': inserted, 'upserted_ids': upserted_ids})
+    return jsonify({
+        'inserted': inserted,
+        'upserted': len(upserted_ids),
+        'failed': len(errors),
+        'errors': errors
+    }), 201 if written or not errors else 400
 
 # Get all students
-@app.route('/api/students', methods=['GET'])
+SORT_COLUMNS = repository.STUDENT_COLUMNS
+LIST_PARAMS = ('course', 'age_min', 'age_max', 'sort', 'fields', 'format')
+
+def student_query_from_args(args):
+    """
+    Build a StudentQuery from ?course=&age_min=&age_max=&sort=&fields=.
+    Returns (query, None) or (None, error message).
+    """
+    courses = [c.strip() for c in args.get('course', '').split(',') if c.strip()]
+    try:
+        age_min = int(args['age_min']) if args.get('age_min') else None
+        age_max = int(args['age_max']) if args.get('age_max') else None
+    except ValueError:
+        return None, 'age_min and age_max must be integers'
+    
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    sort = sort[1:] if descending else sort
+    if sort not in SORT_COLUMNS:
+        return None, f"sort must be one of {', '.join(SORT_COLUMNS)}, optionally prefixed with -"
+    
+    fields = [f.strip() for f in args.get('fields', '').split(',') if f.strip()] or SORT_COLUMNS
+    unknown = [f for f in fields if f not in SORT_COLUMNS]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+    if sort not in fields:
+        fields = list(fields) + [sort]
+    
+    return repository.StudentQuery(courses, age_min, age_max, sort, descending, fields), None
+
+def explain_response(query):
+    """?explain=true: the statement and the database's plan (token required)."""
+    token = bearer_token()
+    try:
+        tokens.verify(token or '')
+    except jwt.InvalidTokenError:
+        return jsonify({'error': 'explain requires a valid token'}), 401
+    
+    sql, params = query.sql()
+    try:
+        plan = repository.explain(db.cursor(read_only=True), sql, params, db.standin)
+    except Exception as e:
+        return jsonify({'error': str(e), 'sql': sql}), 500
+    return jsonify({'sql': sql, 'params': params, 'plan': plan}), 200
+
+@bp.route('/api/students', methods=['GET'])
 def get_all_students():
+    """
+    Without ?limit/?after every match is streamed (export mode). With
+    them, a keyset page is returned with a next cursor. Both accept
+    course=, age_min=, age_max=, sort=[-]column and fields=a,b.
+    """
+    serializer = negotiate()
+    if serializer is None:
+        return not_acceptable()
+    
+    if 'ids' in request.args:
+        return get_students_by_ids(serializer)
+    
+    query, error = student_query_from_args(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    paged = 'limit' in request.args or 'after' in request.args
+    if paged:
+        try:
+            query.limit = int(request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT']))
+            if request.args.get('after'):
+                query.after = query.decode_cursor(request.args['after'])
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer and after a cursor from a previous page'}), 400
+        
+        if not 1 <= query.limit <= current_app.config['PAGE_SIZE_MAX']:
+            return jsonify({'error': f"limit must be between 1 and {current_app.config['PAGE_SIZE_MAX']}"}), 400
+    
+    if request.args.get('explain') == 'true':
+        return explain_response(query)
+    
+    if not paged:
+        return export_students(serializer, query)
+    
+    def load_page():
+        records, next_after = repository.list_filtered(db.cursor(read_only=True, cacheable=True), query)
+        return {
+            'students': records,
+            'next_cursor': query.encode_cursor(next_after)
+        }
+    
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM students")
-        students = cursor.fetchall()
-        
-        # Format as list of dictionaries
-        student_list = []
-        for student in students:
-            student_list.append({
-                'id': student[0],
-                'name': student[1],
-                'course': student[2],
-                'age': student[3]
-            })
+        entry = cache.get_or_load(cache.list_key('page', *query.cache_key()), load_page)
+        next_cursor = entry.data['next_cursor']
         
-        format_type = request.args.get('format', 'json')
+        next_url = None
+        headers = {}
+        if next_cursor is not None:
+            params = {key: request.args[key] for key in LIST_PARAMS if key in request.args}
+            params.update(limit=query.limit, after=next_cursor)
+            next_url = url_for('.get_all_students', **params)
+            headers['Link'] = f'<{next_url}>; rel="next"'
         
-        if format_type == 'xml':
-            return json_to_xml(student_list), 200, {'Content-Type': 'application/xml'}
-        else:
-            return jsonify(student_list), 200
+        def build():
+            if serializer.tabular:
+                return rows_response(serializer, query.fields, record_rows(entry.data['students'], query.fields))
+            return document_response(serializer, dict(entry.data, next=next_url))
+        
+        return conditional_response(entry.etag, serializer.name, build, headers)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_ids(value):
+    """'1,2,3' -> [1, 2, 3] without duplicates, or raise ValueError."""
+    ids = []
+    for part in value.split(','):
+        student_id = int(part)
+        if student_id < 1:
+            raise ValueError(part)
+        ids.append(student_id)
+    return list(dict.fromkeys(ids))
+
+def load_students(student_ids):
+    """
+    {id: Student} through the cache; the misses are read with chunked
+    IN (...) queries and cached individually.
+    """
+    keys = {cache.student_key(student_id): student_id for student_id in student_ids}
+    found = {keys[key]: entry.data for key, entry in cache.get_many(list(keys)).items()}
+    
+    missing = [student_id for student_id in student_ids if student_id not in found]
+    if missing:
+        loaded = repository.get_students(db.cursor(read_only=True, cacheable=True), missing,
+                                         current_app.config['IN_CHUNK_SIZE'])
+        for student in loaded.values():
+            cache.put(cache.student_key(student.id), student, student.etag)
+        found.update(loaded)
+    return found
+
+def get_students_by_ids(serializer):
+    """
+    ?ids=1,2,3: the requested students in request order, plus missing
+    ids (in an X-Missing-Ids header for the tabular formats).
+    """
+    try:
+        student_ids = parse_ids(request.args['ids'])
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of positive integers'}), 400
+    
+    if len(student_ids) > current_app.config['BATCH_IDS_MAX']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_IDS_MAX']} ids per request"}), 400
+    
+    try:
+        found = load_students(student_ids)
+        missing = [student_id for student_id in student_ids if student_id not in found]
+        students = [found[student_id] for student_id in student_ids if student_id in found]
+        
+        if serializer.tabular:
+            response = rows_response(serializer, repository.STUDENT_COLUMNS,
+                                     (student.to_row() for student in students))
+            response.headers['X-Missing-Ids'] = ','.join(map(str, missing))
+            return response
+        return document_response(serializer, {
+            'students': [student.to_dict() for student in students],
+            'missing': missing
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def export_students(serializer, query):
+    """Stream every match from a server-side cursor."""
+    try:
+        cursor = repository.list_filtered(db.cursor(streaming=True, read_only=True), query)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    # Rows go from the cursor to the encoder as tuples, no per-row objects
+    rows = iter_rows(cursor, current_app.config['STREAM_BATCH_SIZE'])
+    response = rows_response(serializer, query.fields, rows, stream=True)
+    # The cursor is read after teardown; keep its connection until the body is done
+    response.call_on_close(db.detach())
+    return response
+
 # Get single student by ID
-@app.route('/api/students/<int:student_id>', methods=['GET'])
+@bp.route('/api/students/<int:student_id>', methods=['GET'])
 def get_student(student_id):
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM students WHERE id = %s", (student_id,))
-        student = cursor.fetchone()
+        entry = load_student(student_id)
         
-        if not student:
+        if not entry:
             return jsonify({'error': 'Student not found'}), 404
         
-        student_data = {
-            'id': student[0],
-            'name': student[1],
-            'course': student[2],
-            'age': student[3]
-        }
+        serializer = negotiate()
+        if serializer is None:
+            return not_acceptable()
         
-        format_type = request.args.get('format', 'json')
+        def build():
+            if serializer.tabular:
+                return rows_response(serializer, repository.STUDENT_COLUMNS, [entry.data.to_row()])
+            return document_response(serializer, entry.data.to_dict())
         
-        if format_type == 'xml':
-            return json_to_xml(student_data), 200, {'Content-Type': 'application/xml'}
-        else:
-            return jsonify(student_data), 200
+        return conditional_response(entry.etag, serializer.name, build)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Update student by ID
-@app.route('/api/students/<int:student_id>', methods=['PUT'])
+@bp.route('/api/students/<int:student_id>', methods=['PUT'])
 @token_required
 def update_student(current_user, student_id):
+    """
+    Partial update in one conditional UPDATE. With If-Match, only the
+    tagged version is overwritten; a lost race answers 412 instead of
+    silently clobbering the other writer.
+    """
     try:
-        data = request.get_json()
-        
-        # Check if student exists
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id FROM students WHERE id = %s", (student_id,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Student not found'}), 404
+        changes, error = validate_student_changes(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Build dynamic update query based on provided fields
-        updates = []
-        values = []
+        expected = if_match_versions(student_id)
+        if expected == []:
+            return jsonify({'error': 'If-Match does not name this student'}), 412
         
-        if 'name' in data:
-            if not data['name'] or not data['name'].strip():
-                return jsonify({'error': 'Name cannot be empty'}), 400
-            updates.append("name = %s")
-            values.append(data['name'].strip())
+        # The UPDATE doubles as existence and version check
+        student, error = write_update(db.cursor(), student_id, changes, expected)
+        if error:
+            status, message = error
+            return jsonify({'error': message}), status
+        db.connection.commit()
+        updated(student)
         
-        if 'course' in data:
-            if not data['course'] or not data['course'].strip():
-                return jsonify({'error': 'Course cannot be empty'}), 400
-            updates.append("course = %s")
-            values.append(data['course'].strip())
-        
-        if 'age' in data:
-            try:
-                age = int(data['age'])
-                if not 16 <= age <= 60:
-                    return jsonify({'error': 'Age must be between 16 and 60'}), 400
-                updates.append("age = %s")
-                values.append(age)
-            except (ValueError, TypeError):
-                return jsonify({'error': 'Age must be a valid integer'}), 400
-        
-        if not updates:
-            return jsonify({'error': 'No fields to update'}), 400
-        
-        # Add student_id to values
-        values.append(student_id)
-        
-        # Execute update
-        query = f"UPDATE students SET {', '.join(updates)} WHERE id = %s"
-        cursor.execute(query, values)
-        mysql.connection.commit()
-        
-        # Get updated student data
-        cursor.execute("SELECT * FROM students WHERE id = %s", (student_id,))
-        updated_student = cursor.fetchone()
-        
-        return jsonify({
+        response = jsonify({
             'message': 'Student updated successfully',
-            'student': {
-                'id': updated_student[0],
-                'name': updated_student[1],
-                'course': updated_student[2],
-                'age': updated_student[3]
-            }
-        }), 200
+            'student': student.to_dict()
+        })
+        response.set_etag(f'{student.etag}-json')
+        return response, 200
         
     except Exception as e:
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Delete student by ID
-@app.route('/api/students/<int:student_id>', methods=['DELETE'])
+@bp.route('/api/students/<int:student_id>', methods=['DELETE'])
 @token_required
 def delete_student(current_user, student_id):
     try:
-        cursor = mysql.connection.cursor()
-        
-        # Check if student exists
-        cursor.execute("SELECT * FROM students WHERE id = %s", (student_id,))
-        student = cursor.fetchone()
-        
-        if not student:
-            return jsonify({'error': 'Student not found'}), 404
-        
         # Optional: Check for confirm parameter
         confirm = request.args.get('confirm', 'false').lower()
         if confirm != 'true':
-            return jsonify({
+            entry = load_student(student_id)
+            if not entry:
+                return jsonify({'error': 'Student not found'}), 404
+            response = jsonify({
                 'message': 'Add ?confirm=true to confirm deletion',
-                'student': {
-                    'id': student[0],
-                    'name': student[1],
-                    'course': student[2],
-                    'age': student[3]
-                }
-            }), 200
-        
-        # Delete the student
-        cursor.execute("DELETE FROM students WHERE id = %s", (student_id,))
-        mysql.connection.commit()
-        
-        # Check if deletion was successful
-        if cursor.rowcount > 0:
-            return '', 204  # No Content on successful deletion
-        else:
-            return jsonify({'error': 'Deletion failed'}), 500
+                'student': entry.data.to_dict()
+            })
+            response.set_etag(f'{entry.etag}-json')
+            return response, 200
+        
+        expected = if_match_versions(student_id)
+        if expected == []:
+            return jsonify({'error': 'If-Match does not name this student'}), 412
+        
+        # Delete the student; no matched row means it is gone or has moved on
+        error = write_delete(db.cursor(), student_id, expected)
+        if error:
+            status, message = error
+            return jsonify({'error': message}), status
+        db.connection.commit()
+        deleted(student_id)
+        
+        return '', 204  # No Content on successful deletion
             
     except Exception as e:
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Change feed (Server-Sent Events)
+@bp.route('/api/students/events', methods=['GET'])
+def student_events():
+    """
+    created/updated/deleted/bulk events as they happen. Reconnecting
+    clients send Last-Event-ID (or ?last_event_id=) to resume.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Under serve.py a stream gives its request thread back to the worker
+    start_stream = request.environ.get('serve.start_stream')
+    if start_stream is not None and not start_stream():
+        return jsonify({'error': 'No stream slots free on this worker'}), 503, {'Retry-After': '30'}
+    try:
+        subscription, replay = events.subscribe(last_event_id)
+    except TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    
+    # No stream_with_context: an idle subscriber holds no request context
+    body = subscription.stream(events.ping_interval, replay)
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/api/students/events/stats', methods=['GET'])
+def student_events_stats():
+    return jsonify(events.stats()), 200
+
+# Delta sync
+@bp.route('/api/students/changes', methods=['GET'])
+def student_changes():
+    """
+    Rows inserted, updated or deleted after ?since=<cursor> (0 for a full
+    sync), in pages of ?limit. Keep calling with next_cursor while
+    has_more is true; deletes arrive as {"operation": "delete", "id": ...}.
+    """
+    try:
+        since = int(request.args.get('since', ''))
+        limit = int(request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT']))
+    except ValueError:
+        return jsonify({'error': 'since (a cursor, 0 to start) and limit must be integers'}), 400
+    
+    if since < 0:
+        return jsonify({'error': 'since must not be negative'}), 400
+    if not 1 <= limit <= current_app.config['PAGE_SIZE_MAX']:
+        return jsonify({'error': f"limit must be between 1 and {current_app.config['PAGE_SIZE_MAX']}"}), 400
+    
+    try:
+        changes, next_cursor, has_more = repository.list_changes(
+            db.cursor(read_only=True), since, limit, current_app.config['CHANGES_SETTLE_SECONDS'])
+        page = {'changes': changes, 'next_cursor': str(next_cursor), 'has_more': has_more}
+        
+        serializer = negotiate(tabular=False)
+        if serializer is None:
+            return not_acceptable(tabular=False)
+        return document_response(serializer, page)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Aggregate statistics
+@bp.route('/api/students/stats', methods=['GET'])
+def student_stats():
+    """Counts by course, age distribution and totals from summary counters"""
+    try:
+        stats = repository.student_stats(db.cursor(read_only=True))
+        serializer = negotiate(tabular=False)
+        if serializer is None:
+            return not_acceptable(tabular=False)
+        
+        return conditional_response(make_etag(stats), serializer.name,
+                                    lambda: document_response(serializer, stats))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/students/stats/reconcile', methods=['POST'])
+@token_required
+def reconcile_student_stats(current_user):
+    """Rebuild the counters from the students table now"""
+    try:
+        drifted = reconciler.run()
+        return jsonify(dict(reconciler.status(), drifted=drifted)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Batch of sub-operations
+BATCH_METHODS = ('get', 'create', 'update', 'delete')
+
+def run_operation(operation, in_transaction, effects):
+    """
+    Run one /api/batch sub-operation. Returns (status, body); post-commit
+    side effects are appended to effects.
+    """
+    if not isinstance(operation, dict) or operation.get('method') not in BATCH_METHODS:
+        return 400, {'error': f"method must be one of {', '.join(BATCH_METHODS)}"}
+    
+    method = operation['method']
+    student_id = operation.get('id')
+    if method != 'create' and (not isinstance(student_id, int) or student_id < 1):
+        return 400, {'error': 'id must be a positive integer'}
+    
+    if method == 'get':
+        # Inside a transaction, read our own uncommitted writes
+        if in_transaction:
+            student = repository.get_student(db.cursor(), student_id)
+        else:
+            entry = load_student(student_id)
+            student = entry.data if entry else None
+        if student is None:
+            return 404, {'error': 'Student not found'}
+        return 200, student.to_dict()
+    
+    if method == 'create':
+        values, error = validate_student(operation.get('data'))
+        if error:
+            return 400, {'error': error}
+        student = write_create(db.cursor(), values)
+        effects.append(lambda: created(student))
+        return 201, {'id': student.id}
+    
+    expected = None
+    if operation.get('if_match'):
+        expected = if_match_versions(student_id, parse_etags(operation['if_match']))
+        if expected == []:
+            return 412, {'error': 'if_match does not name this student'}
+    
+    if method == 'update':
+        changes, error = validate_student_changes(operation.get('data'))
+        if error:
+            return 400, {'error': error}
+        student, error = write_update(db.cursor(), student_id, changes, expected)
+        if error:
+            return error[0], {'error': error[1]}
+        effects.append(lambda: updated(student))
+        return 200, {'student': student.to_dict(), 'etag': f'{student.etag}-json'}
+    
+    error = write_delete(db.cursor(), student_id, expected)
+    if error:
+        return error[0], {'error': error[1]}
+    effects.append(lambda: deleted(student_id))
+    return 204, None
+
+@bp.route('/api/batch', methods=['POST'])
+@token_required
+def batch(current_user):
+    """
+    Run {"operations": [{"method": "get|create|update|delete", "id": ...,
+    "data": {...}, "if_match": "..."}], "transaction": false} in one
+    request. With "transaction": true, all operations commit together and
+    the first failure rolls everything back (409).
+    """
+    body = request.get_json(silent=True)
+    operations = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Body must be {"operations": [...]}'}), 400
+    if len(operations) > current_app.config['BATCH_MAX_OPERATIONS']:
+        return jsonify({'error': f"At most {current_app.config['BATCH_MAX_OPERATIONS']} operations per batch"}), 400
+    
+    in_transaction = bool(body.get('transaction'))
+    results = []
+    effects = []
+    
+    try:
+        for index, operation in enumerate(operations):
+            status, result = run_operation(operation, in_transaction, effects)
+            results.append({'status': status, 'body': result})
+            
+            if in_transaction and status >= 400:
+                db.connection.rollback()
+                return jsonify({
+                    'transaction': True,
+                    'committed': False,
+                    'failed_operation': index,
+                    'results': results
+                }), 409
+            
+            if not in_transaction and effects:
+                db.connection.commit()
+                effects.pop()()
+        
+        if in_transaction:
+            db.connection.commit()
+            for effect in effects:
+                effect()
+        
+        return jsonify({'transaction': in_transaction, 'committed': True, 'results': results}), 200
+        
+    except Exception as e:
+        db.connection.rollback()
+        return jsonify({'error': str(e), 'results': results}), 500
+
 # Search students
-@app.route('/api/students/search', methods=['GET'])
+@bp.route('/api/students/search', methods=['GET'])
 def search_students():
     search_term = request.args.get('q', '')
     
@@ -435,39 +1010,252 @@ def search_students():
         return jsonify({'error': 'Search query parameter "q" is required'}), 400
     
     try:
-        cursor = mysql.connection.cursor()
-        # Search in name and course fields
-        cursor.execute(
-            "SELECT * FROM students WHERE name LIKE %s OR course LIKE %s",
-            (f'%{search_term}%', f'%{search_term}%')
-        )
-        students = cursor.fetchall()
-        
-        # Format results
-        student_list = []
-        for student in students:
-            student_list.append({
-                'id': student[0],
-                'name': student[1],
-                'course': student[2],
-                'age': student[3]
-            })
-        
-        # Check format parameter
-        format_type = request.args.get('format', 'json')
+        limit = int(request.args.get('limit', current_app.config['SEARCH_LIMIT_DEFAULT']))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    if not 1 <= limit <= current_app.config['SEARCH_LIMIT_MAX']:
+        return jsonify({'error': f"limit must be between 1 and {current_app.config['SEARCH_LIMIT_MAX']}"}), 400
+    
+    serializer = negotiate()
+    if serializer is None:
+        return not_acceptable()
+    
+    try:
+        # Ranked prefix search over the name/course fulltext index
+        students = repository.search_students(db.cursor(read_only=True), search_term, limit)
         
-        if format_type == 'xml':
-            return json_to_xml({
-                'search_term': search_term,
-                'results': student_list,
-                'count': len(student_list)
-            }), 200, {'Content-Type': 'application/xml'}
-        else:
-            return jsonify({
-                'search_term': search_term,
-                'results': student_list,
-                'count': len(student_list)
-            }), 200
+        if serializer.tabular:
+            return rows_response(serializer, repository.STUDENT_COLUMNS,
+                                 (student.to_row() for student in students))
+        return document_response(serializer, {
+            'search_term': search_term,
+            'results': [student.to_dict() for student in students],
+            'count': len(students)
+        })
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+# Cache statistics
+@bp.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(dict(cache.stats(), compressed=compressor.stats())), 200
+
+# Connection pool statistics
+@bp.route('/api/db/stats', methods=['GET'])
+def db_stats():
+    return jsonify(db.stats()), 200
+
+# Prometheus scrape endpoint
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ==================== BACKGROUND JOBS ====================
+def job_query(params, **overrides):
+    """
+    A StudentQuery from job params, which take the GET /api/students
+    filters; a list such as "course": ["CS", "Math"] means course=CS,Math.
+    """
+    args = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, list) and all(isinstance(item, (str, int)) for item in value):
+            value = ','.join(str(item) for item in value)
+        elif not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            return None, f'{key} must be a string, a number or a list of them'
+        args[key] = str(value)
+    args.update(overrides)
+    return student_query_from_args(args)
+
+def validate_export_job(params):
+    if params.get('format', 'csv') not in serializers.SERIALIZERS:
+        return f"format must be one of {', '.join(serializers.available())}"
+    return job_query(params)[1]
+
+def validate_delete_job(params):
+    query, error = job_query(params)
+    if error:
+        return error
+    # Checked on the parsed query, so "course": [] or "" cannot mean "everyone"
+    if not query.courses and query.age_min is None and query.age_max is None:
+        return 'A delete job needs at least one of course, age_min, age_max'
+    return None
+
+@jobs.handler('export', validate=validate_export_job)
+def export_job(job, conn, params):
+    """Write the matching students to a file for download, in any API format."""
+    serializer = serializers.SERIALIZERS[params.get('format', 'csv')]
+    query, _ = job_query(params)
+    # Only jobs need the CLI module; the web app starts without it
+    from setup_database import open_export_cursor
+    cursor = repository.list_filtered(open_export_cursor(conn, db.standin), query)
+    
+    def counted(rows):
+        written = 0
+        for row in rows:
+            yield row
+            written += 1
+            if written % jobs.batch_size == 0:
+                job.progress(written)
+        job.progress(written)
+    
+    with open(job.result_path(serializer.name), 'wb') as handle:
+        for chunk in serializer.rows(query.fields, counted(iter_rows(cursor, jobs.batch_size))):
+            handle.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    
+    return {'rows': job.done, 'format': serializer.name, 'file': job.result_file}
+
+@jobs.handler('delete', validate=validate_delete_job)
+def delete_job(job, conn, params):
+    """Delete matching students, one committed batch at a time."""
+    query, _ = job_query(params, fields='id', sort='id')
+    query.limit = jobs.batch_size
+    cursor = conn.cursor()
+    
+    deleted = 0
+    while True:
+        records, _ = repository.list_filtered(cursor, query)
+        if not records:
+            break
+        ids = [record['id'] for record in records]
+        deleted += repository.delete_students(cursor, ids)
+        conn.commit()
+        cache.invalidate_students(ids)
+        events.publish('bulk', {'deleted_ids': ids})
+        # A cancel stops here; batches already committed stay deleted
+        job.progress(deleted)
+    
+    return {'deleted': deleted}
+
+@jobs.handler('reindex')
+def reindex_job(job, conn, params):
+    """Rebuild the stats counters, compact the change log, refresh index statistics."""
+    cursor = conn.cursor()
+    drifted = repository.reconcile_stats(cursor)
+    conn.commit()
+    job.progress(1, 3)
+    compacted = repository.compact_changes(cursor)
+    conn.commit()
+    job.progress(2, 3)
+    repository.analyze_students(cursor, db.standin)
+    job.progress(3, 3)
+    return {'stats_drifted': drifted, 'changes_compacted': compacted}
+
+def job_response(job):
+    job = dict(job)
+    job['download'] = (url_for('.download_job_result', job_id=job['id'])
+                       if jobs.result_file(job) else None)
+    return job
+
+@bp.route('/api/jobs', methods=['POST'])
+@token_required
+def submit_job(current_user):
+    """
+    Run an export, delete or reindex job in the background:
+    {"kind": "export", "params": {"format": "csv", "course": "CS"}}.
+    Returns 202 with the job; poll GET /api/jobs/<id>.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    
+    kind = data.get('kind')
+    params = data.get('params') or {}
+    error = jobs.validate(kind, params)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        job_id = jobs.submit(kind, params, current_user)
+        job = jobs.get(job_id)
+    except QueueFull as e:
+        return too_many_requests(e.retry_after)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify(job_response(job)), 202, {'Location': url_for('.get_job', job_id=job_id)}
+
+@bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    try:
+        job = jobs.get(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job)), 200
+
+@bp.route('/api/jobs/<int:job_id>', methods=['DELETE'])
+@token_required
+def cancel_job(current_user, job_id):
+    """Cancel a queued job now, or ask a running one to stop at its next batch."""
+    try:
+        outcome = jobs.cancel(job_id)
+        job = jobs.get(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if outcome is None:
+        return jsonify({'error': f"Job already {job['status']}"}), 409
+    return jsonify(job_response(job)), 202
+
+@bp.route('/api/jobs/<int:job_id>/result', methods=['GET'])
+@token_required
+def download_job_result(current_user, job_id):
+    try:
+        job = jobs.get(job_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    path = jobs.result_file(job)
+    if path is None:
+        return jsonify({'error': f"Job is {job['status']} and has no result file"}), 409
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+# ==================== PROFILING (ADMIN) ====================
+PROFILE_SORTS = ('cumulative', 'tottime', 'calls')
+
+def profile_admin_required(f):
+    """After token_required: only users listed in PROFILE_ADMINS."""
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if current_user not in current_app.config['PROFILE_ADMINS']:
+            return jsonify({'error': 'Profiles are restricted to administrators'}), 403
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
+@bp.route('/api/admin/profiles', methods=['GET'])
+@token_required
+@profile_admin_required
+def list_profiles(current_user):
+    """Aggregated per-endpoint profiles collected so far"""
+    return jsonify({'profiles': profiler.list()}), 200
+
+@bp.route('/api/admin/profiles/<name>', methods=['GET'])
+@token_required
+@profile_admin_required
+def download_profile(current_user, name):
+    """The raw pstats file, or ?format=text for the top functions"""
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in PROFILE_SORTS:
+        return jsonify({'error': f"sort must be one of {', '.join(PROFILE_SORTS)}"}), 400
+    
+    if request.args.get('format') == 'text':
+        report = profiler.report(name, sort)
+        if report is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return Response(report, content_type='text/plain; charset=utf-8')
+    
+    path = profiler.find(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{name}.prof')
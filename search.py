@@ -0,0 +1,62 @@
+# search.py
+"""
+Student search backed by the FULLTEXT index on students(name, course).
+
+Every term in the query must match, as a word prefix, and results are
+ranked by MySQL's relevance score. Queries made only of terms shorter
+than the fulltext token size fall back to a prefix LIKE, which can still
+use the B-tree indexes on name and course. Neither path scans the table,
+and the index is maintained by MySQL on every INSERT, UPDATE and DELETE.
+"""
+import re
+
+# Matches InnoDB's default innodb_ft_min_token_size
+MIN_TOKEN_LENGTH = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+FULLTEXT_SQL = (
+    "SELECT id, name, course, age, version, "
+    "MATCH(name, course) AGAINST (%s IN BOOLEAN MODE) AS score "
+    "FROM students "
+    "WHERE MATCH(name, course) AGAINST (%s IN BOOLEAN MODE) "
+    "ORDER BY score DESC, id "
+    "LIMIT %s"
+)
+
+PREFIX_SQL = (
+    "SELECT id, name, course, age, version, 0 AS score "
+    "FROM students "
+    "WHERE name LIKE %s OR course LIKE %s "
+    "ORDER BY id "
+    "LIMIT %s"
+)
+
+def tokenize(query):
+    """Split a query into lower-case word tokens, dropping operators."""
+    return [token.lower() for token in TOKEN_RE.findall(query)]
+
+def boolean_query(tokens):
+    """Require every token as a prefix: ['comp', 'sci'] -> '+comp* +sci*'."""
+    return ' '.join(f'+{token}*' for token in tokens)
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input is matched literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def build_search(query, limit):
+    """Return (sql, params) for a ranked, limited search."""
+    tokens = [token for token in tokenize(query) if len(token) >= MIN_TOKEN_LENGTH]
+    
+    if tokens:
+        against = boolean_query(tokens)
+        return FULLTEXT_SQL, (against, against, limit)
+    
+    prefix = escape_like(query.strip()) + '%'
+    return PREFIX_SQL, (prefix, prefix, limit)
+
+def search_students(cursor, query, limit):
+    """Run a search and return rows of (id, name, course, age, version, score)."""
+    sql, params = build_search(query, limit)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
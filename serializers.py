@@ -0,0 +1,179 @@
+# serializers.py
+"""
+Wire formats for API responses, chosen per request by content negotiation.
+
+A serializer turns either one document (a dict, e.g. a page with its
+cursor) or a stream of rows (tuples plus column names, e.g. straight
+from a cursor) into chunks of text or bytes, so every format can be
+streamed. JSON, XML and MessagePack encode both; CSV and NDJSON are
+tabular and only encode rows, so routes whose payload is not a list of
+records offer just the document formats.
+
+MessagePack needs the msgpack package and is only registered when it is
+installed. A MessagePack row stream is a sequence of maps, one per row,
+read with msgpack.Unpacker; a document is a single map.
+"""
+import csv
+import io
+import json
+
+import repository
+from utils import iter_xml, stream_json_array
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ROWS_PER_CHUNK = 100
+
+def compact_json(data):
+    return json.dumps(data, separators=(',', ':'), sort_keys=True, default=plain)
+
+def plain(value):
+    """Records such as repository.Student become dicts."""
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f'{type(value).__name__} is not serializable')
+
+def row_encoder(columns):
+    """Compact sorted-key JSON for one row; the student columns skip the dict."""
+    if tuple(columns) == repository.STUDENT_COLUMNS:
+        return repository.row_to_json
+    return lambda row: compact_json(dict(zip(columns, row)))
+
+# ==================== SERIALIZERS ====================
+class Serializer:
+    name = None
+    mimetype = None
+    tabular = False
+
+    def document(self, data):
+        """Chunks encoding one document."""
+        raise NotImplementedError
+
+    def rows(self, columns, rows):
+        """Chunks encoding an iterable of row tuples with these columns."""
+        raise NotImplementedError
+
+class JSONSerializer(Serializer):
+    name = 'json'
+    mimetype = 'application/json'
+
+    def document(self, data):
+        # Same text as jsonify outside debug mode
+        yield compact_json(data) + '\n'
+
+    def rows(self, columns, rows):
+        return stream_json_array(rows, row_encoder(columns), ROWS_PER_CHUNK)
+
+class XMLSerializer(Serializer):
+    name = 'xml'
+    mimetype = 'application/xml'
+
+    def document(self, data):
+        return iter_xml(data, chunk_size=ROWS_PER_CHUNK)
+
+    def rows(self, columns, rows):
+        return iter_xml((dict(zip(columns, row)) for row in rows), chunk_size=ROWS_PER_CHUNK)
+
+class CSVSerializer(Serializer):
+    name = 'csv'
+    mimetype = 'text/csv'
+    tabular = True
+
+    def rows(self, columns, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % ROWS_PER_CHUNK == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+class NDJSONSerializer(Serializer):
+    name = 'ndjson'
+    mimetype = 'application/x-ndjson'
+    tabular = True
+
+    def rows(self, columns, rows):
+        encode = row_encoder(columns)
+        lines = []
+        for row in rows:
+            lines.append(encode(row) + '\n')
+            if len(lines) >= ROWS_PER_CHUNK:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+class MessagePackSerializer(Serializer):
+    name = 'msgpack'
+    mimetype = 'application/msgpack'
+
+    def document(self, data):
+        yield msgpack.packb(data, default=plain)
+
+    def rows(self, columns, rows):
+        packer = msgpack.Packer(default=plain)
+        chunk = []
+        for row in rows:
+            chunk.append(packer.pack(dict(zip(columns, row))))
+            if len(chunk) >= ROWS_PER_CHUNK:
+                yield b''.join(chunk)
+                chunk = []
+        if chunk:
+            yield b''.join(chunk)
+
+# ==================== REGISTRY ====================
+SERIALIZERS = {}
+
+def register(serializer):
+    SERIALIZERS[serializer.name] = serializer
+    return serializer
+
+for serializer in (JSONSerializer(), XMLSerializer(), CSVSerializer(), NDJSONSerializer()):
+    register(serializer)
+if msgpack is not None:
+    register(MessagePackSerializer())
+
+# Other names clients use for the same formats
+MIMETYPE_ALIASES = {
+    'text/xml': 'xml',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack'
+}
+
+def available(tabular=True):
+    """Names of the registered formats, without the tabular ones if not wanted."""
+    return [name for name, serializer in SERIALIZERS.items() if tabular or not serializer.tabular]
+
+def by_mimetype(mimetype):
+    name = MIMETYPE_ALIASES.get(mimetype)
+    if name is None:
+        name = next((s.name for s in SERIALIZERS.values() if s.mimetype == mimetype), None)
+    return SERIALIZERS.get(name)
+
+def negotiate(accept, format_name=None, tabular=True, default='json'):
+    """
+    The serializer for a request, or None if the format named by
+    ?format= is not offered. The Accept header decides when it names one
+    of the offered types (by quality, then the client's order); wildcards
+    do not count, so browsers and generic clients get ?format=, then JSON.
+    """
+    allowed = available(tabular)
+    best, best_quality = None, 0
+    for mimetype, quality in accept:
+        serializer = by_mimetype(mimetype)
+        if serializer is not None and serializer.name in allowed and quality > best_quality:
+            best, best_quality = serializer, quality
+    if best is not None:
+        return best
+
+    name = format_name or default
+    return SERIALIZERS[name] if name in allowed else None
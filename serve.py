@@ -0,0 +1,332 @@
+# serve.py
+"""
+Production server: a master process builds the application once, then
+pre-forks SERVE_WORKERS workers that share its listening socket.
+
+Each worker handles up to SERVE_THREADS connections at a time on a
+thread pool. While all of them are busy it stops accepting, so the
+kernel hands new connections to idle workers. Long-lived streams such
+as /api/students/events run on up to SERVE_STREAMS further threads per
+worker and do not count against SERVE_THREADS; beyond that they get a
+503. After SERVE_MAX_REQUESTS requests (plus a random
+0..SERVE_MAX_REQUESTS_JITTER, so workers do not all restart together)
+a worker drains and exits and the master forks a replacement, which
+starts warm from the preloaded master.
+
+SIGTERM or SIGINT drains: workers stop accepting, then finish in-flight
+requests and background jobs for up to SERVE_GRACEFUL_TIMEOUT seconds
+before exiting. The master kills any worker still running after that;
+a second signal kills them at once.
+
+Token revocations, login throttling, cache invalidation and events
+must reach every worker, so more than one worker needs a shared
+CACHE_BACKEND, e.g. STUDENT_API_CACHE_BACKEND=/var/cache/students.db
+for a cache.SQLiteCache file. Without one serve.py runs a single
+worker by default and refuses --workers above 1; with one it defaults
+to a worker per CPU. Connection pools and metrics stay per worker:
+each scrape of /metrics reads the worker that answered it, and its
+counters restart when that worker is replaced. Sampled profiles are
+merged into PROFILE_DIR by every worker. Draining closes open streams
+at once; their clients reconnect to another worker with Last-Event-ID.
+Needs fork (POSIX).
+
+Usage: python serve.py [--host 0.0.0.0] [--port 5000] [--workers N] [--threads N] [--streams N]
+                       [--max-requests N] [--graceful-timeout S]
+Options default to the SERVE_* config, e.g. STUDENT_API_SERVE_WORKERS=4.
+"""
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from app import create_app, cache, events, metrics, shutdown
+
+log = logging.getLogger('serve')
+
+# ==================== WORKER ====================
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # Also bounds how long an idle keep-alive connection holds a thread
+        self.timeout = self.server.keepalive
+        super().setup()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.draining or self.server.local.streaming:
+            self.close_connection = True
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Werkzeug's WSGI server with connections handled on a fixed thread pool.
+
+    A long-lived stream moves its connection from the `threads` request
+    slots to one of `streams` stream slots (see start_stream), so idle
+    subscribers never stop the worker from accepting requests.
+    """
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads, keepalive, streams=0, fd=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.threads = threads
+        self.keepalive = keepalive
+        self.max_streams = streams
+        self.draining = False
+        self.active = 0
+        self.streams = 0
+        self.local = threading.local()
+        self.idle = threading.Condition()
+        self.executor = ThreadPoolExecutor(threads + streams, thread_name_prefix='request')
+
+    def service_actions(self):
+        # Runs between accepts: wait for a free thread before taking
+        # another connection, so other workers get it instead
+        with self.idle:
+            while self.active >= self.threads and not self.draining:
+                self.idle.wait()
+
+    def process_request(self, request, client_address):
+        with self.idle:
+            self.active += 1
+        self.executor.submit(self.handle_connection, request, client_address)
+
+    def handle_connection(self, request, client_address):
+        self.local.streaming = False
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.idle:
+                if self.local.streaming:
+                    self.streams -= 1
+                else:
+                    self.active -= 1
+                self.idle.notify_all()
+
+    def start_stream(self):
+        """
+        Move the calling request's connection to a stream slot; False when
+        none is free or the worker is draining. The connection closes
+        when the stream ends.
+        """
+        with self.idle:
+            if self.local.streaming:
+                return True
+            if self.draining or self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            self.active -= 1
+            self.local.streaming = True
+            self.idle.notify_all()
+        return True
+
+    def drain(self):
+        """Stop accepting; the serve_forever loop returns shortly after."""
+        with self.idle:
+            self.draining = True
+            self.idle.notify_all()
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def wait_idle(self, timeout):
+        """Wait for open connections to finish; False if some are left."""
+        deadline = time.monotonic() + timeout
+        with self.idle:
+            while self.active or self.streams:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.idle.wait(remaining)
+        return True
+
+class Worker:
+    """A forked worker: serves until drained or max_requests is reached."""
+
+    def __init__(self, app, sock, options):
+        self.app = app
+        self.sock = sock
+        self.options = options
+        self.requests = 0
+        self.max_requests = options.max_requests and options.max_requests + random.randint(0, options.jitter)
+        self.drain_started = None
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.requests += 1
+            recycle = self.requests == self.max_requests
+        if recycle:
+            log.info('Worker %d served %d requests, recycling', os.getpid(), self.requests)
+            self.drain()
+        # Read by streaming views such as /api/students/events
+        environ['serve.start_stream'] = self.server.start_stream
+        return self.app(environ, start_response)
+
+    def drain(self, *_):
+        with self._lock:
+            if self.drain_started is not None:
+                return
+            self.drain_started = time.monotonic()
+        self.server.drain()
+        # Streams never finish by themselves; their clients reconnect
+        # (with Last-Event-ID) to another worker
+        events.close_all()
+
+    def run(self):
+        started = time.perf_counter()
+        host, port = self.sock.getsockname()[:2]
+        self.server = PooledWSGIServer(host, port, self, self.options.threads, self.options.keepalive,
+                                       self.options.streams, fd=self.sock.fileno())
+        signal.signal(signal.SIGTERM, self.drain)
+        signal.signal(signal.SIGINT, self.drain)
+        log.info('Worker %d ready in %.1fms', os.getpid(), (time.perf_counter() - started) * 1000)
+        self.server.serve_forever(poll_interval=0.5)
+        # Streams subscribed while the drain was starting
+        events.close_all()
+
+        timeout = self.options.graceful_timeout
+        if not self.server.wait_idle(timeout):
+            log.warning('Worker %d exiting with requests still open', os.getpid())
+        remaining = max(0, timeout - (time.monotonic() - self.drain_started))
+        if not shutdown(remaining):
+            log.warning('Worker %d exiting with background jobs unfinished', os.getpid())
+
+# ==================== MASTER ====================
+class Master:
+    """Forks the workers, replaces those that exit, and drains them on a signal."""
+
+    def __init__(self, app, options):
+        self.app = app
+        self.options = options
+        self.workers = {}
+        self.stopping = False
+        self.kill_at = None
+        self.respawn_at = 0
+
+    def run(self):
+        self.sock = socket.create_server((self.options.host, self.options.port),
+                                         backlog=BaseWSGIServer.request_queue_size)
+        host, port = self.sock.getsockname()[:2]
+        log.info('Listening on http://%s:%d with %d workers x %d threads',
+                 host, port, self.options.workers, self.options.threads)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while True:
+            self.reap()
+            if self.stopping:
+                if not self.workers:
+                    break
+                if time.monotonic() >= self.kill_at:
+                    self.kill(signal.SIGKILL)
+            elif time.monotonic() >= self.respawn_at:
+                while len(self.workers) < self.options.workers:
+                    self.spawn()
+            time.sleep(0.1)
+        self.sock.close()
+        log.info('Stopped')
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            # The master's handlers would signal its other workers
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                Worker(self.app, self.sock, self.options).run()
+            except BaseException:
+                log.exception('Worker %d failed', os.getpid())
+                code = 1
+            finally:
+                # Skip the master's atexit handlers and non-daemon threads
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            born = self.workers.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0 and not self.stopping:
+                log.warning('Worker %d exited with %d', pid, code)
+                if born is not None and time.monotonic() - born < 1:
+                    # Failing at startup: do not fork in a tight loop
+                    self.respawn_at = time.monotonic() + 1
+
+    def stop(self, *_):
+        if self.stopping:
+            log.info('Killing workers')
+            self.kill(signal.SIGKILL)
+            return
+        log.info('Draining workers (up to %ss)', self.options.graceful_timeout)
+        self.stopping = True
+        self.kill_at = time.monotonic() + self.options.graceful_timeout + 1
+        self.kill(signal.SIGTERM)
+
+    def kill(self, signum):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+
+def parse_options(config, argv=None, shared=False):
+    workers = config['SERVE_WORKERS']
+    if workers is None:
+        # Several workers only once they can share state (see above)
+        workers = (os.cpu_count() or 2) if shared else 1
+    parser = argparse.ArgumentParser(description='Serve the application with pre-forked workers.')
+    parser.add_argument('--host', default=config['SERVE_HOST'])
+    parser.add_argument('--port', type=int, default=config['SERVE_PORT'])
+    parser.add_argument('--workers', type=int, default=workers)
+    parser.add_argument('--threads', type=int, default=config['SERVE_THREADS'])
+    parser.add_argument('--streams', type=int, default=config['SERVE_STREAMS'],
+                        help='long-lived streams (SSE) per worker, on threads of their own')
+    parser.add_argument('--max-requests', type=int, default=config['SERVE_MAX_REQUESTS'],
+                        help='replace a worker after this many requests, 0 = never')
+    parser.add_argument('--max-requests-jitter', dest='jitter', type=int,
+                        default=config['SERVE_MAX_REQUESTS_JITTER'])
+    parser.add_argument('--graceful-timeout', type=float, default=config['SERVE_GRACEFUL_TIMEOUT'])
+    parser.add_argument('--keepalive', type=float, default=config['SERVE_KEEPALIVE'])
+    options = parser.parse_args(argv)
+    if options.workers < 1 or options.threads < 1:
+        parser.error('--workers and --threads must be at least 1')
+    if options.streams < 0:
+        parser.error('--streams must not be negative')
+    return options
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='[%(process)d] %(message)s')
+    if not hasattr(os, 'fork'):
+        sys.exit('serve.py needs os.fork; use app.py for development on this platform')
+
+    app = create_app()
+    options = parse_options(app.config, argv, cache.backend.shared)
+    if options.workers > 1 and not cache.backend.shared:
+        sys.exit('More than one worker needs a shared CACHE_BACKEND, e.g. '
+                 'STUDENT_API_CACHE_BACKEND=/var/cache/students.db; otherwise logouts, '
+                 'login throttling, cache invalidation and events stay inside one worker')
+    startup = metrics.startup
+    log.info('Application ready in %.1fms (import %.1fms, create_app %.1fms)',
+             sum(startup.values()) * 1000, startup['import'] * 1000, startup['create_app'] * 1000)
+    Master(app, options).run()
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,127 @@
 # setup_database.py
-import mysql.connector
+"""
+Schema setup plus bulk import/export:
+
+    python setup_database.py [setup]
+    python setup_database.py import students.csv [--resume] [--batch-size 5000]
+    python setup_database.py export students.ndjson [--partitions 4]
+
+Formats are CSV (with an id,name,course,age header) or NDJSON, picked
+from the file extension or --format. See --help of each subcommand.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from db import connect_mysql, connector_from_config
+from utils import chunked, iter_rows, validate_student
+import repository
+
+# Summary counters behind /api/students/stats. Triggers keep them exact
+# for every writer (single, bulk, upsert) inside the writing transaction;
+# repository.reconcile_stats rebuilds them from the base table.
+STATS_TRIGGERS = {
+    'students_stats_insert': """
+        AFTER INSERT ON students FOR EACH ROW
+        BEGIN
+            INSERT INTO student_course_stats (course, students, age_sum, age_count)
+            VALUES (NEW.course, 1, COALESCE(NEW.age, 0), NEW.age IS NOT NULL)
+            ON DUPLICATE KEY UPDATE students = students + 1,
+                age_sum = age_sum + VALUES(age_sum), age_count = age_count + VALUES(age_count);
+            IF NEW.age IS NOT NULL THEN
+                INSERT INTO student_age_stats (age, students) VALUES (NEW.age, 1)
+                ON DUPLICATE KEY UPDATE students = students + 1;
+            END IF;
+        END
+    """,
+    'students_stats_update': """
+        AFTER UPDATE ON students FOR EACH ROW
+        BEGIN
+            IF NOT (OLD.course <=> NEW.course AND OLD.age <=> NEW.age) THEN
+                UPDATE student_course_stats
+                SET students = students - 1, age_sum = age_sum - COALESCE(OLD.age, 0),
+                    age_count = age_count - (OLD.age IS NOT NULL)
+                WHERE course = OLD.course;
+                INSERT INTO student_course_stats (course, students, age_sum, age_count)
+                VALUES (NEW.course, 1, COALESCE(NEW.age, 0), NEW.age IS NOT NULL)
+                ON DUPLICATE KEY UPDATE students = students + 1,
+                    age_sum = age_sum + VALUES(age_sum), age_count = age_count + VALUES(age_count);
+            END IF;
+            IF NOT (OLD.age <=> NEW.age) THEN
+                IF OLD.age IS NOT NULL THEN
+                    UPDATE student_age_stats SET students = students - 1 WHERE age = OLD.age;
+                END IF;
+                IF NEW.age IS NOT NULL THEN
+                    INSERT INTO student_age_stats (age, students) VALUES (NEW.age, 1)
+                    ON DUPLICATE KEY UPDATE students = students + 1;
+                END IF;
+            END IF;
+        END
+    """,
+    'students_stats_delete': """
+        AFTER DELETE ON students FOR EACH ROW
+        BEGIN
+            UPDATE student_course_stats
+            SET students = students - 1, age_sum = age_sum - COALESCE(OLD.age, 0),
+                age_count = age_count - (OLD.age IS NOT NULL)
+            WHERE course = OLD.course;
+            IF OLD.age IS NOT NULL THEN
+                UPDATE student_age_stats SET students = students - 1 WHERE age = OLD.age;
+            END IF;
+        END
+    """
+}
+
+# Change log behind /api/students/changes: one row per write, appended in
+# the writer's transaction. Deleted students keep their entry as a tombstone.
+CHANGE_TRIGGERS = {
+    'students_changes_insert': """
+        AFTER INSERT ON students FOR EACH ROW
+        INSERT INTO student_changes (student_id, operation) VALUES (NEW.id, 'insert')
+    """,
+    'students_changes_update': """
+        AFTER UPDATE ON students FOR EACH ROW
+        INSERT INTO student_changes (student_id, operation) VALUES (NEW.id, 'update')
+    """,
+    'students_changes_delete': """
+        AFTER DELETE ON students FOR EACH ROW
+        INSERT INTO student_changes (student_id, operation) VALUES (OLD.id, 'delete')
+    """
+}
+
+def add_index_if_missing(cursor, table, index_name, definition):
+    """Add an index to an existing table unless it is already there."""
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """,
+        (table, index_name)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there."""
+    cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """,
+        (table, column)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
 
 def setup_database():
     try:
         # Connect to MySQL
-        conn = mysql.connector.connect(
+        conn = connect_mysql(
             host='localhost',
             user='root',
             password='root'
@@ -32,10 +149,113 @@ def setup_database():
                 id INT PRIMARY KEY AUTO_INCREMENT,
                 name VARCHAR(100) NOT NULL,
                 course VARCHAR(50) NOT NULL,
-                age INT CHECK (age >= 16 AND age <= 60)
+                age INT CHECK (age >= 16 AND age <= 60),
+                version INT NOT NULL DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Row version for optimistic concurrency (If-Match on PUT/DELETE)
+        add_column_if_missing(cursor, 'students', 'version', "INT NOT NULL DEFAULT 1")
+        add_column_if_missing(cursor, 'students', 'created_at', "TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+        add_column_if_missing(cursor, 'students', 'updated_at',
+                              "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+        
+        # Search indexes: fulltext for ranked word-prefix matches, B-trees
+        # for the short-term prefix fallback (see search.py)
+        add_index_if_missing(cursor, 'students', 'ft_students_name_course',
+                             "FULLTEXT INDEX ft_students_name_course (name, course)")
+        add_index_if_missing(cursor, 'students', 'idx_students_name',
+                             "INDEX idx_students_name (name)")
+        add_index_if_missing(cursor, 'students', 'idx_students_course',
+                             "INDEX idx_students_course (course)")
+        
+        # Composite indexes for /api/students filters and sorts: equality on
+        # course first, then the range or sort column (id is implied)
+        add_index_if_missing(cursor, 'students', 'idx_students_course_age',
+                             "INDEX idx_students_course_age (course, age)")
+        add_index_if_missing(cursor, 'students', 'idx_students_course_name',
+                             "INDEX idx_students_course_name (course, name)")
+        add_index_if_missing(cursor, 'students', 'idx_students_age',
+                             "INDEX idx_students_age (age)")
+        
+        # Summary counters for /api/students/stats
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS student_course_stats (
+                course VARCHAR(50) PRIMARY KEY,
+                students INT NOT NULL DEFAULT 0,
+                age_sum BIGINT NOT NULL DEFAULT 0,
+                age_count INT NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS student_age_stats (
+                age INT PRIMARY KEY,
+                students INT NOT NULL DEFAULT 0
+            )
+        """)
+        
+        # Change log for delta sync (/api/students/changes)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS student_changes (
+                seq BIGINT PRIMARY KEY AUTO_INCREMENT,
+                student_id INT NOT NULL,
+                operation VARCHAR(6) NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_student_changes_student (student_id, seq)
+            )
+        """)
+        
+        # Progress of `setup_database.py import` runs, for --resume
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                name VARCHAR(255) PRIMARY KEY,
+                source VARCHAR(1024) NOT NULL,
+                position BIGINT NOT NULL,
+                rows_read BIGINT NOT NULL,
+                inserted BIGINT NOT NULL,
+                failed BIGINT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Background jobs (POST /api/jobs); see jobs.py
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INT PRIMARY KEY AUTO_INCREMENT,
+                kind VARCHAR(20) NOT NULL,
+                params TEXT NOT NULL,
+                status VARCHAR(10) NOT NULL,
+                progress BIGINT NOT NULL DEFAULT 0,
+                total BIGINT NULL,
+                result TEXT NULL,
+                error TEXT NULL,
+                cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+                created_by VARCHAR(50) NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP NULL,
+                finished_at TIMESTAMP NULL,
+                INDEX idx_jobs_status (status, id)
             )
         """)
         
+        # Periodic tasks claimed by one worker per run (see stats.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schedules (
+                name VARCHAR(50) PRIMARY KEY,
+                next_run_at DOUBLE NOT NULL
+            )
+        """)
+        
+        for name, definition in {**STATS_TRIGGERS, **CHANGE_TRIGGERS}.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {definition}")
+        
+        # Backfill the counters and the change log from existing rows
+        repository.reconcile_stats(cursor)
+        repository.backfill_changes(cursor)
+        
         print("Database setup completed successfully!")
         
         conn.commit()
@@ -45,5 +265,302 @@ def setup_database():
     except Exception as e:
         print(f"Error setting up database: {e}")
 
+# ==================== IMPORT ====================
+def connection_config(args):
+    """The app's connection settings from command-line options."""
+    return {
+        'MYSQL_HOST': args.host,
+        'MYSQL_PORT': args.port,
+        'MYSQL_USER': args.user,
+        'MYSQL_PASSWORD': args.password,
+        'MYSQL_DB': args.database,
+        'DATABASE_STANDIN': args.standin
+    }
+
+def detect_format(path, given):
+    """--format if given, else csv for *.csv and ndjson for anything else."""
+    if given:
+        return given
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+def iter_lines(handle):
+    """Decoded lines read with readline, so handle.tell() stays exact."""
+    for line in iter(handle.readline, b''):
+        yield line.decode('utf-8')
+
+def iter_import_records(handle, format_type, fieldnames):
+    """
+    Yield records (dicts, or an Exception for an unreadable line) from
+    the current position of a binary file handle, one line at a time.
+    """
+    if format_type == 'csv':
+        for values in csv.reader(iter_lines(handle)):
+            if values:
+                yield dict(zip(fieldnames, values))
+        return
+    
+    for line in iter_lines(handle):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+def import_values(record, mode):
+    """
+    Validate one record like create_student does. Returns
+    ('insert', values), ('upsert', (id,) + values) or (None, error).
+    """
+    if isinstance(record, Exception):
+        return None, f'Invalid JSON: {record}'
+    
+    values, error = validate_student(record)
+    if error:
+        return None, error
+    
+    student_id = record.get('id')
+    if mode == 'upsert' and student_id not in (None, ''):
+        try:
+            student_id = int(student_id)
+        except (ValueError, TypeError):
+            return None, 'id must be a positive integer'
+        if student_id < 1:
+            return None, 'id must be a positive integer'
+        return 'upsert', (student_id,) + values
+    return 'insert', values
+
+class Progress:
+    """Prints rows and rows/sec to stderr every `interval` seconds."""
+    
+    def __init__(self, label, interval=5.0):
+        self.label = label
+        self.interval = interval
+        self.start = self.last = time.monotonic()
+    
+    def update(self, rows, force=False):
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            self.last = now
+            print(f'{self.label}: {rows} rows, {self.rate(rows):.0f} rows/sec', file=sys.stderr)
+    
+    def rate(self, rows):
+        return rows / max(time.monotonic() - self.start, 1e-9)
+
+def import_students(args):
+    """
+    Stream a CSV/NDJSON file into students. Each batch is one multi-row
+    INSERT in its own transaction, and the same transaction records the
+    file position in import_checkpoints, so after a crash --resume
+    continues from the last committed batch without duplicating rows.
+    Rejected records are reported and skipped.
+    """
+    format_type = detect_format(args.file, args.format)
+    name = args.name or os.path.basename(args.file)
+    conn = connector_from_config(connection_config(args))()
+    try:
+        cursor = conn.cursor()
+        with open(args.file, 'rb') as handle, \
+                (open(args.errors, 'a', encoding='utf-8') if args.errors else nullcontext()) as errors:
+            fieldnames = None
+            if format_type == 'csv':
+                fieldnames = next(csv.reader([handle.readline().decode('utf-8-sig')]), None)
+                if not fieldnames:
+                    print(f'{args.file}: empty CSV file', file=sys.stderr)
+                    return 1
+            
+            rows_read = inserted = failed = 0
+            checkpoint = repository.get_checkpoint(cursor, name)
+            if checkpoint is not None and args.resume:
+                position, rows_read, inserted, failed = checkpoint
+                handle.seek(position)
+                print(f'Resuming {name} at row {rows_read}', file=sys.stderr)
+            elif checkpoint is not None:
+                print(f'{name} has a checkpoint at row {checkpoint[1]}; pass --resume to continue '
+                      f'or --restart to start over', file=sys.stderr)
+                if not args.restart:
+                    return 1
+            
+            progress = Progress(f'import {name}')
+            started_at = rows_read
+            for batch in chunked(iter_import_records(handle, format_type, fieldnames), args.batch_size):
+                inserts = []
+                upserts = []
+                for record in batch:
+                    kind, values = import_values(record, args.mode)
+                    rows_read += 1
+                    if kind == 'insert':
+                        inserts.append(values)
+                    elif kind == 'upsert':
+                        upserts.append(values)
+                    else:
+                        failed += 1
+                        if errors:
+                            errors.write(json.dumps({'row': rows_read, 'error': values}) + '\n')
+                
+                try:
+                    if inserts:
+                        repository.insert_students(cursor, inserts)
+                    if upserts:
+                        repository.upsert_students(cursor, upserts)
+                    inserted += len(inserts) + len(upserts)
+                    repository.save_checkpoint(cursor, name, os.path.abspath(args.file),
+                                               handle.tell(), rows_read, inserted, failed)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                progress.update(rows_read - started_at)
+            
+            # Done: the checkpoint only matters for an interrupted load
+            repository.delete_checkpoint(cursor, name)
+            conn.commit()
+    finally:
+        conn.close()
+    
+    progress.update(rows_read - started_at, force=True)
+    print(f'Imported {inserted} students from {rows_read} rows ({failed} rejected) '
+          f'at {progress.rate(rows_read - started_at):.0f} rows/sec')
+    return 0
+
+# ==================== EXPORT ====================
+def open_export_cursor(conn, standin):
+    """A server-side (unbuffered) cursor on MySQL; rows are read as they arrive."""
+    if standin:
+        return conn.cursor()
+    import MySQLdb.cursors
+    return conn.cursor(MySQLdb.cursors.SSCursor)
+
+def write_rows(handle, rows, format_type):
+    """Write (id, name, course, age, ...) rows; returns how many."""
+    count = 0
+    if format_type == 'csv':
+        writer = csv.writer(handle)
+        writer.writerow(repository.STUDENT_COLUMNS)
+        for row in rows:
+            writer.writerow(row[:4])
+            count += 1
+        return count
+    
+    for row in rows:
+        handle.write(repository.row_to_json(row) + '\n')
+        count += 1
+    return count
+
+def export_partition(config, path, format_type, low, high, batch_size):
+    """Export ids low..high (or every row when low is None) to path."""
+    conn = connector_from_config(config)()
+    try:
+        cursor = open_export_cursor(conn, config['DATABASE_STANDIN'])
+        if low is None:
+            repository.list_all(cursor)
+        else:
+            repository.list_range(cursor, low, high)
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            return write_rows(handle, iter_rows(cursor, batch_size), format_type)
+    finally:
+        conn.close()
+
+def partition_ranges(low, high, partitions):
+    """Split low..high into contiguous id ranges of about equal width."""
+    width = max((high - low + 1 + partitions - 1) // partitions, 1)
+    return [(start, min(start + width - 1, high)) for start in range(low, high + 1, width)]
+
+def partition_path(path, index):
+    root, ext = os.path.splitext(path)
+    return f'{root}-{index:03d}{ext}'
+
+def export_students(args):
+    """
+    Stream students to a CSV/NDJSON file through a server-side cursor.
+    With --partitions N the id range is split N ways and each part is
+    exported by its own process and connection to <file>-NNN.<ext>.
+    """
+    format_type = detect_format(args.file, args.format)
+    config = connection_config(args)
+    progress = Progress(f'export {args.file}')
+    
+    if args.partitions <= 1:
+        if args.file == '-':
+            conn = connector_from_config(config)()
+            cursor = open_export_cursor(conn, args.standin)
+            repository.list_all(cursor)
+            rows = write_rows(sys.stdout, iter_rows(cursor, args.batch_size), format_type)
+            conn.close()
+        else:
+            rows = export_partition(config, args.file, format_type, None, None, args.batch_size)
+        print(f'Exported {rows} students at {progress.rate(rows):.0f} rows/sec', file=sys.stderr)
+        return 0
+    
+    if args.file == '-':
+        print('--partitions needs a file name, not -', file=sys.stderr)
+        return 1
+    
+    conn = connector_from_config(config)()
+    low, high = repository.id_bounds(conn.cursor())
+    conn.close()
+    if low is None:
+        print('No students to export', file=sys.stderr)
+        return 0
+    
+    ranges = partition_ranges(low, high, args.partitions)
+    paths = [partition_path(args.file, index) for index in range(len(ranges))]
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(export_partition, config, path, format_type, start, end, args.batch_size)
+                   for path, (start, end) in zip(paths, ranges)]
+        counts = [future.result() for future in futures]
+    
+    for path, count in zip(paths, counts):
+        print(f'{path}: {count} rows', file=sys.stderr)
+    rows = sum(counts)
+    print(f'Exported {rows} students in {len(paths)} parts at {progress.rate(rows):.0f} rows/sec',
+          file=sys.stderr)
+    return 0
+
+# ==================== CLI ====================
+def build_parser():
+    parser = argparse.ArgumentParser(description='Set up the database and bulk import/export students.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='root')
+    parser.add_argument('--database', default='cs_elec')
+    parser.add_argument('--standin', metavar='PATH', help='use a SQLite stand-in file instead of MySQL')
+    commands = parser.add_subparsers(dest='command')
+    
+    commands.add_parser('setup', help='create or upgrade the schema (the default)')
+    
+    importer = commands.add_parser('import', help='load students from CSV or NDJSON')
+    importer.add_argument('file')
+    importer.add_argument('--format', choices=('csv', 'ndjson'), help='default: from the file extension')
+    importer.add_argument('--mode', choices=('insert', 'upsert'), default='insert',
+                          help='upsert replaces students whose id is given')
+    importer.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT and transaction')
+    importer.add_argument('--name', help='checkpoint name (default: the file name)')
+    importer.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+    importer.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    importer.add_argument('--errors', metavar='PATH', help='append rejected rows here as NDJSON')
+    
+    exporter = commands.add_parser('export', help='write students to CSV or NDJSON')
+    exporter.add_argument('file', help='output file, or - for stdout')
+    exporter.add_argument('--format', choices=('csv', 'ndjson'), help='default: from the file extension')
+    exporter.add_argument('--partitions', type=int, default=1, help='parallel id-range parts')
+    exporter.add_argument('--batch-size', type=int, default=5000, help='rows fetched per round trip')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'import':
+        return import_students(args)
+    if args.command == 'export':
+        return export_students(args)
+    if args.standin:
+        import standin
+        standin.create_schema(args.standin)
+        return 0
+    setup_database()
+    return 0
+
 if __name__ == '__main__':
-    setup_database()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,273 @@
+# standin.py
+"""
+Local SQLite stand-in for the MySQL database, for tests and benchmarks.
+
+Connections accept the MySQL dialect used by this app: %s placeholders,
+ON DUPLICATE KEY UPDATE ... VALUES(col), LIKE with backslash escapes,
+FOR UPDATE, LAST_INSERT_ID(expr) reported through cursor.lastrowid, and
+boolean-mode MATCH ... AGAINST (emulated without an index). Point the
+app at it with app.config['DATABASE_STANDIN'] = path.
+"""
+import re
+import sqlite3
+import weakref
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    course VARCHAR(50) NOT NULL,
+    age INT CHECK (age >= 16 AND age <= 60),
+    version INT NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_students_name ON students (name);
+CREATE INDEX IF NOT EXISTS idx_students_course ON students (course);
+CREATE INDEX IF NOT EXISTS idx_students_course_age ON students (course, age, id);
+CREATE INDEX IF NOT EXISTS idx_students_course_name ON students (course, name, id);
+CREATE INDEX IF NOT EXISTS idx_students_age ON students (age, id);
+
+CREATE TABLE IF NOT EXISTS student_course_stats (
+    course VARCHAR(50) PRIMARY KEY,
+    students INT NOT NULL DEFAULT 0,
+    age_sum BIGINT NOT NULL DEFAULT 0,
+    age_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS student_age_stats (
+    age INT PRIMARY KEY,
+    students INT NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS students_stats_insert AFTER INSERT ON students BEGIN
+    INSERT INTO student_course_stats (course, students, age_sum, age_count)
+    VALUES (NEW.course, 1, COALESCE(NEW.age, 0), NEW.age IS NOT NULL)
+    ON CONFLICT (course) DO UPDATE SET students = students + 1,
+        age_sum = age_sum + excluded.age_sum, age_count = age_count + excluded.age_count;
+    INSERT INTO student_age_stats (age, students) SELECT NEW.age, 1 WHERE NEW.age IS NOT NULL
+    ON CONFLICT (age) DO UPDATE SET students = students + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS students_stats_update AFTER UPDATE OF course, age ON students
+WHEN NOT (OLD.course IS NEW.course AND OLD.age IS NEW.age) BEGIN
+    UPDATE student_course_stats
+    SET students = students - 1, age_sum = age_sum - COALESCE(OLD.age, 0),
+        age_count = age_count - (OLD.age IS NOT NULL)
+    WHERE course = OLD.course;
+    INSERT INTO student_course_stats (course, students, age_sum, age_count)
+    VALUES (NEW.course, 1, COALESCE(NEW.age, 0), NEW.age IS NOT NULL)
+    ON CONFLICT (course) DO UPDATE SET students = students + 1,
+        age_sum = age_sum + excluded.age_sum, age_count = age_count + excluded.age_count;
+    UPDATE student_age_stats SET students = students - 1
+    WHERE age = OLD.age AND OLD.age IS NOT NEW.age;
+    INSERT INTO student_age_stats (age, students) SELECT NEW.age, 1
+    WHERE NEW.age IS NOT NULL AND OLD.age IS NOT NEW.age
+    ON CONFLICT (age) DO UPDATE SET students = students + 1;
+END;
+
+CREATE TABLE IF NOT EXISTS student_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INT NOT NULL,
+    operation VARCHAR(6) NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_student_changes_student ON student_changes (student_id, seq);
+
+CREATE TRIGGER IF NOT EXISTS students_changes_insert AFTER INSERT ON students BEGIN
+    INSERT INTO student_changes (student_id, operation) VALUES (NEW.id, 'insert');
+END;
+
+CREATE TRIGGER IF NOT EXISTS students_changes_update AFTER UPDATE ON students BEGIN
+    INSERT INTO student_changes (student_id, operation) VALUES (NEW.id, 'update');
+END;
+
+CREATE TRIGGER IF NOT EXISTS students_changes_delete AFTER DELETE ON students BEGIN
+    INSERT INTO student_changes (student_id, operation) VALUES (OLD.id, 'delete');
+END;
+
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+    name VARCHAR(255) PRIMARY KEY,
+    source VARCHAR(1024) NOT NULL,
+    position BIGINT NOT NULL,
+    rows_read BIGINT NOT NULL,
+    inserted BIGINT NOT NULL,
+    failed BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind VARCHAR(20) NOT NULL,
+    params TEXT NOT NULL,
+    status VARCHAR(10) NOT NULL,
+    progress BIGINT NOT NULL DEFAULT 0,
+    total BIGINT,
+    result TEXT,
+    error TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+    created_by VARCHAR(50),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+
+CREATE TABLE IF NOT EXISTS schedules (
+    name VARCHAR(50) PRIMARY KEY,
+    next_run_at DOUBLE NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS students_stats_delete AFTER DELETE ON students BEGIN
+    UPDATE student_course_stats
+    SET students = students - 1, age_sum = age_sum - COALESCE(OLD.age, 0),
+        age_count = age_count - (OLD.age IS NOT NULL)
+    WHERE course = OLD.course;
+    UPDATE student_age_stats SET students = students - 1 WHERE age = OLD.age;
+END;
+"""
+
+# ==================== SQL TRANSLATION ====================
+MATCH_RE = re.compile(r'MATCH\s*\(([^)]*)\)\s*AGAINST\s*\(\s*%s\s+IN\s+BOOLEAN\s+MODE\s*\)', re.I)
+UPSERT_RE = re.compile(r'ON\s+DUPLICATE\s+KEY\s+UPDATE', re.I)
+VALUES_RE = re.compile(r'VALUES\((\w+)\)', re.I)
+LIKE_RE = re.compile(r'LIKE\s+%s', re.I)
+FOR_UPDATE_RE = re.compile(r'\s+FOR\s+UPDATE', re.I)
+
+_translated = {}
+
+def translate(sql):
+    """Rewrite one MySQL statement into SQLite (results are memoized)."""
+    cached = _translated.get(sql)
+    if cached is not None:
+        return cached
+
+    out = MATCH_RE.sub(lambda m: f'match_against(%s, {m.group(1)})', sql)
+    match = UPSERT_RE.search(out)
+    if match:
+        head, tail = out[:match.start()], out[match.end():]
+        out = head + 'ON CONFLICT DO UPDATE SET' + VALUES_RE.sub(r'excluded.\1', tail)
+    out = LIKE_RE.sub("LIKE %s ESCAPE '\\\\'", out)
+    out = FOR_UPDATE_RE.sub('', out)
+    out = out.replace('%s', '?')
+
+    _translated[sql] = out
+    return out
+
+def match_against(query, *columns):
+    """
+    Score for a boolean-mode query made of '+term*' words: the number of
+    required prefixes found among the words of the columns, 0 if any is
+    missing.
+    """
+    words = ' '.join(str(c) for c in columns if c is not None).lower().split()
+    terms = [t.strip('+*') for t in query.split()]
+    score = 0
+    for term in terms:
+        hits = sum(1 for word in words if word.startswith(term))
+        if not hits:
+            return 0
+        score += hits
+    return score
+
+# ==================== DB-API WRAPPERS ====================
+class StandinCursor:
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+        self._last_insert_id = None
+
+    def execute(self, sql, params=()):
+        self._connection.last_insert_id = None
+        self._cursor.execute(translate(sql), tuple(params or ()))
+        self._last_insert_id = self._connection.last_insert_id
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_params):
+        self._connection.last_insert_id = None
+        self._cursor.executemany(translate(sql), seq_of_params)
+        self._last_insert_id = self._connection.last_insert_id
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        # Like mysql_insert_id(): LAST_INSERT_ID(expr) in an UPDATE wins
+        if self._last_insert_id is not None:
+            return self._last_insert_id
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+class StandinConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.create_function('match_against', -1, match_against, deterministic=True)
+        self._conn.create_function('LAST_INSERT_ID', 1, self._set_last_insert_id)
+        self.last_insert_id = None
+        self._cursors = weakref.WeakSet()
+
+    def _set_last_insert_id(self, value):
+        self.last_insert_id = value
+        return value
+
+    def cursor(self, *args):
+        cursor = self._conn.cursor()
+        self._cursors.add(cursor)
+        return StandinCursor(cursor, self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        # A partly read SELECT keeps its snapshot open in SQLite even after
+        # a rollback, and MySQL refuses new commands until an unbuffered
+        # result is read; the pool rolls back on release, so end them here
+        for cursor in list(self._cursors):
+            cursor.close()
+        self._conn.rollback()
+
+    def ping(self):
+        self._conn.execute('SELECT 1')
+
+    def close(self):
+        self._conn.close()
+
+def connect(path):
+    return StandinConnection(path)
+
+def create_schema(path):
+    """Create the stand-in tables (idempotent)."""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
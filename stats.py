@@ -0,0 +1,108 @@
+# stats.py
+import threading
+import time
+
+import repository
+
+class StatsReconciler:
+    """
+    Periodically rebuilds the student summary counters from the base
+    table. The triggers keep them exact; this catches drift from writes
+    that bypassed them (manual fixes, restores) and reports it.
+
+    Runs every STATS_RECONCILE_INTERVAL seconds, once per deployment:
+    each worker's daemon thread (started with its first request; 0
+    disables it) polls the schedules table, and only the worker whose
+    conditional UPDATE claims the due run does the work. The next run
+    time lives in the table, so recycling workers does not reset it.
+    The same pass compacts the change log behind /api/students/changes.
+    """
+    SCHEDULE = 'students_stats'
+    # How often a worker checks whether a run is due
+    POLL_SECONDS = 60
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self.runs = 0
+        self.drifted = 0
+        self.last_run = None
+        self.last_seconds = None
+        self.last_error = None
+        self.compacted = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        app.config.setdefault('STATS_RECONCILE_INTERVAL', 3600)
+
+        self.app = app
+        self.db = db or self.db
+        self.interval = app.config['STATS_RECONCILE_INTERVAL']
+        if self.interval:
+            app.before_request(self._start)
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name='stats-reconciler', daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(min(self.interval, self.POLL_SECONDS))
+            try:
+                if self.claim():
+                    self.run()
+                    self.compact()
+            except Exception as e:
+                self.app.logger.warning('Stats reconciliation failed: %s', e)
+
+    def claim(self):
+        """Whether this worker takes the run that is due now, if any."""
+        with self.db.pool.connection() as conn:
+            claimed = repository.claim_schedule(conn.cursor(), self.SCHEDULE, time.time(), self.interval)
+            conn.commit()
+        return claimed
+
+    def run(self):
+        """Reconcile now in one transaction; returns the drifted counter count."""
+        start = time.perf_counter()
+        with self._lock, self.db.pool.connection() as conn:
+            try:
+                drifted = repository.reconcile_stats(conn.cursor())
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                self.last_error = str(e)
+                raise
+
+        self.runs += 1
+        self.drifted += drifted
+        self.last_run = time.time()
+        self.last_seconds = round(time.perf_counter() - start, 6)
+        self.last_error = None
+        if drifted:
+            self.app.logger.warning('Stats reconciliation fixed %d drifted counters', drifted)
+        return drifted
+
+    def compact(self):
+        """Drop superseded change-log entries; returns how many went."""
+        with self._lock, self.db.pool.connection() as conn:
+            removed = repository.compact_changes(conn.cursor())
+            conn.commit()
+        self.compacted += removed
+        return removed
+
+    def status(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'drifted_total': self.drifted,
+            'last_run': self.last_run,
+            'last_seconds': self.last_seconds,
+            'last_error': self.last_error,
+            'changes_compacted': self.compacted
+        }
@@ -1,30 +1,192 @@
 # utils.py
 import json
-from dicttoxml import dicttoxml
 from flask import Response
 
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" ?>'
+XML_ESCAPES = str.maketrans({
+    '&': '&amp;',
+    '"': '&quot;',
+    "'": '&apos;',
+    '<': '&lt;',
+    '>': '&gt;'
+})
+
+def xml_text(value):
+    """Render a scalar the way dicttoxml does (attr_type=False)."""
+    if value is None:
+        return ''
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, str):
+        return value.translate(XML_ESCAPES)
+    return str(value)
+
+def xml_element(key, value):
+    """
+    Render one element; mappings (dicts, or records with items() such as
+    repository.Student) nest, lists become <item> children.
+    """
+    if hasattr(value, 'items'):
+        return f'<{key}>' + ''.join(xml_element(k, v) for k, v in value.items()) + f'</{key}>'
+    if isinstance(value, (list, tuple)):
+        return f'<{key}>' + ''.join(xml_element('item', v) for v in value) + f'</{key}>'
+    return f'<{key}>{xml_text(value)}</{key}>'
+
+def iter_xml_items(items, chunk_size=100):
+    """Yield <item> elements for an iterable, chunk_size elements per chunk."""
+    buffer = []
+    for item in items:
+        buffer.append(xml_element('item', item))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+def iter_xml(data, root_name='response', chunk_size=100):
+    """
+    Encode data as XML incrementally. Lists (and generators, e.g. rows
+    straight from a cursor) are emitted chunk by chunk, so large results
+    are never built as one document. The element layout matches
+    dicttoxml(..., custom_root=root_name, attr_type=False).
+    """
+    yield XML_DECLARATION
+    yield f'<{root_name}>'
+    if hasattr(data, 'items'):
+        for key, value in data.items():
+            if isinstance(value, str) or hasattr(value, 'items') or not hasattr(value, '__iter__'):
+                yield xml_element(key, value)
+            else:
+                yield f'<{key}>'
+                yield from iter_xml_items(value, chunk_size)
+                yield f'</{key}>'
+    else:
+        # A bare list is wrapped in an element named after the root
+        yield f'<{root_name}>'
+        yield from iter_xml_items(data, chunk_size)
+        yield f'</{root_name}>'
+    yield f'</{root_name}>'
+
 def json_to_xml(data, root_name='response'):
     """
     Convert JSON data to XML format
     """
+    return ''.join(iter_xml(data, root_name))
+
+# ==================== VALIDATION ====================
+def validate_student(data):
+    """
+    Apply the create_student rules to one record.
+    Returns ((name, course, age), None) or (None, error_message).
+    """
+    if not isinstance(data, dict):
+        return None, 'Record must be a JSON object'
+    
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None, 'Name is required and cannot be empty'
+    
+    course = data.get('course')
+    if not isinstance(course, str) or not course.strip():
+        return None, 'Course is required'
+    
     try:
-        # If data is a list, wrap it
-        if isinstance(data, list):
-            data = {root_name: data}
-        
-        # Convert to XML
-        xml_data = dicttoxml(data, custom_root=root_name, attr_type=False)
-        return xml_data.decode('utf-8')
-    except Exception as e:
-        # Fallback to simple XML conversion
-        return f'<error>Failed to convert to XML: {str(e)}</error>'
+        age = int(data.get('age', 0))
+    except (ValueError, TypeError):
+        return None, 'Age must be a valid integer'
+    if not 16 <= age <= 60:
+        return None, 'Age must be between 16 and 60'
+    
+    return (name.strip(), course.strip(), age), None
+
+def validate_student_changes(data):
+    """
+    Apply the update_student rules to a partial record.
+    Returns ({column: value}, None) or (None, error_message).
+    """
+    if not isinstance(data, dict):
+        return None, 'Record must be a JSON object'
+    
+    changes = {}
+    
+    if 'name' in data:
+        if not isinstance(data['name'], str) or not data['name'].strip():
+            return None, 'Name cannot be empty'
+        changes['name'] = data['name'].strip()
+    
+    if 'course' in data:
+        if not isinstance(data['course'], str) or not data['course'].strip():
+            return None, 'Course cannot be empty'
+        changes['course'] = data['course'].strip()
+    
+    if 'age' in data:
+        try:
+            age = int(data['age'])
+        except (ValueError, TypeError):
+            return None, 'Age must be a valid integer'
+        if not 16 <= age <= 60:
+            return None, 'Age must be between 16 and 60'
+        changes['age'] = age
+    
+    if not changes:
+        return None, 'No fields to update'
+    
+    return changes, None
+
+# ==================== ITERATION ====================
+def chunked(iterable, size):
+    """Yield lists of up to size items from any iterable."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_rows(cursor, batch_size=500):
+    """
+    Yield rows from a cursor using fetchmany() so the result set is never
+    held in memory at once. The cursor is closed when iteration ends.
+    """
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cursor.close()
+
+def stream_json_array(items, dumps=json.dumps, chunk_size=100):
+    """
+    Encode an iterable as a JSON array, yielding text chunks of up to
+    chunk_size elements instead of building the whole document.
+    """
+    yield '['
+    buffer = []
+    first = True
+    for item in items:
+        buffer.append(dumps(item))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']\n'
 
 def format_response(data, format_type='json'):
     """
-    Format response based on requested format
+    Format response based on requested format (any name registered in
+    serializers, JSON when unknown)
     """
-    if format_type == 'xml':
-        xml_data = json_to_xml(data)
-        return Response(xml_data, mimetype='application/xml')
-    else:
-        return jsonify(data)
\ No newline at end of file
+    import serializers
+    serializer = serializers.SERIALIZERS.get(format_type)
+    if serializer is None or serializer.tabular:
+        serializer = serializers.SERIALIZERS['json']
+    return Response(list(serializer.document(data)), mimetype=serializer.mimetype)